@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Discover LV2 bundles and load their data lazily.
+
+Only the manifest of each bundle is parsed up front, which is enough to list
+the plugins and specifications it contains.  The data files that a subject
+refers to with rdfs:seeAlso are parsed the first time that subject is loaded.
+
+Bundles that nearly everything refers to, like schemas.lv2 and core.lv2, can
+instead be loaded once as a vocabulary, which is cached in a file and shared
+by worlds without being copied.
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import urllib.parse
+import urllib.request
+
+import rdflib
+
+doap = rdflib.Namespace("http://usefulinc.com/ns/doap#")
+lv2 = rdflib.Namespace("http://lv2plug.in/ns/lv2core#")
+owl = rdflib.Namespace("http://www.w3.org/2002/07/owl#")
+rdf = rdflib.Namespace("http://www.w3.org/1999/02/22-rdf-syntax-ns#")
+rdfs = rdflib.Namespace("http://www.w3.org/2000/01/rdf-schema#")
+
+
+def lv2_path():
+    "Return the list of directories in LV2_PATH, or the default path."
+
+    value = os.environ.get("LV2_PATH")
+    if value:
+        paths = value.split(os.pathsep)
+    elif sys.platform == "darwin":
+        paths = [
+            "~/Library/Audio/Plug-Ins/LV2",
+            "~/.lv2",
+            "/usr/local/lib/lv2",
+            "/usr/lib/lv2",
+            "/Library/Audio/Plug-Ins/LV2",
+        ]
+    else:
+        paths = ["~/.lv2", "/usr/local/lib/lv2", "/usr/lib/lv2"]
+
+    return [os.path.expanduser(p) for p in paths if p]
+
+
+def _is_bundle(path):
+    "Return true if path is a bundle directory with a manifest."
+
+    return os.path.isfile(os.path.join(path, "manifest.ttl"))
+
+
+def find_bundles(paths):
+    """Return a sorted list of all bundles in or at paths.
+
+    Each path may be a bundle, a directory that contains bundles, or a file
+    in a bundle.  Directories that do not exist are ignored, since that is
+    common for entries in LV2_PATH.
+    """
+
+    bundles = set()
+    for path in paths:
+        if os.path.isfile(path):
+            path = os.path.dirname(os.path.abspath(path))
+
+        if _is_bundle(path):
+            bundles.add(os.path.abspath(path))
+            continue
+
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir() and _is_bundle(entry.path):
+                        bundles.add(os.path.abspath(entry.path))
+        except OSError:
+            continue
+
+    return sorted(bundles)
+
+
+def file_path(uri):
+    "Return the local path of a file URI, or None if it isn't a file URI."
+
+    parsed = urllib.parse.urlparse(str(uri))
+    if parsed.scheme != "file":
+        return None
+
+    return urllib.request.url2pathname(parsed.path)
+
+
+def _local_path(uri):
+    "Return the local path of a file URI to a Turtle file, or None."
+
+    if isinstance(uri, rdflib.URIRef):
+        path = file_path(uri)
+        if path is not None and path.endswith(".ttl"):
+            return path
+
+    return None
+
+
+def write_if_changed(path, content):
+    """Write a file, unless it already has exactly the given content.
+
+    Content is bytes, or text which is written as UTF-8.  Unchanged files are
+    left alone, so their modification time doesn't trigger rebuilds, and
+    files are replaced atomically, so readers never see a partial file.
+    Returns true if the file was written.
+    """
+
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    try:
+        if os.path.getsize(path) == len(content):
+            with open(path, "rb") as old_file:
+                if old_file.read() == content:
+                    return False
+    except OSError:
+        pass
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as temp_file:
+        temp_file.write(content)
+
+    os.replace(temp_path, path)
+    return True
+
+
+def specification_metadata(model, spec):
+    """Return a dictionary of the basic properties of a specification.
+
+    This is everything needed to list a specification in an index.  Raises
+    rdflib.exceptions.UniquenessError if the version is not unique.
+    """
+
+    minor = int(model.value(spec, lv2.minorVersion, None, any=False))
+    micro = int(model.value(spec, lv2.microVersion, None, any=False))
+    shortdesc = model.value(spec, doap.shortdesc, None, any=False)
+    deprecated = model.value(spec, owl.deprecated, None)
+    deprecated = bool(deprecated) and str(deprecated) not in ["0", "false"]
+
+    return {
+        "uri": str(spec),
+        "name": str(model.value(spec, doap.name, None)),
+        "shortdesc": str(shortdesc) if shortdesc else "",
+        "minorVersion": minor,
+        "microVersion": micro,
+        "deprecated": deprecated,
+    }
+
+
+def file_digests(paths):
+    "Return a dictionary of SHA-256 digests of files, keyed by path."
+
+    digests = {}
+    for path in paths:
+        with open(path, "rb") as data_file:
+            digests[path] = hashlib.sha256(data_file.read()).hexdigest()
+
+    return digests
+
+
+def _turtle_files(bundles):
+    "Return a sorted list of every Turtle file in bundles."
+
+    paths = []
+    for bundle in bundles:
+        for filename in os.listdir(bundle):
+            if filename.endswith(".ttl"):
+                paths += [os.path.abspath(os.path.join(bundle, filename))]
+
+    return sorted(paths)
+
+
+def _signature(paths):
+    "Return a list that changes when any file in paths is modified."
+
+    signature = [rdflib.__version__]
+    for path in paths:
+        stat = os.stat(path)
+        signature += [(path, stat.st_mtime_ns, stat.st_size)]
+
+    return signature
+
+
+# Version of the Vocabulary attributes, to ignore caches from other versions
+VOCABULARY_FORMAT = 2
+
+
+class Vocabulary:
+    """A frozen model of every Turtle file in a set of bundles.
+
+    This is meant to be used as the base of worlds, which see the data of
+    each file as if they had parsed it themselves, but never modify it.
+    """
+
+    def __init__(self, bundles):
+        self.format = VOCABULARY_FORMAT
+        self.paths = _turtle_files(bundles)
+        self.signature = _signature(self.paths)
+
+        # The data and prefixes of each file, which worlds use as if parsed
+        self.graphs = {}
+        self.prefixes = {}
+
+        for path in self.paths:
+            graph = rdflib.Graph(bind_namespaces="none")
+            try:
+                graph.parse(path, format="n3")
+            except SyntaxError:
+                sys.stderr.write(f"error: Failed to parse {path}\n")
+                raise
+
+            self.graphs[path] = graph
+            self.prefixes[path] = list(graph.namespaces())
+
+    def contains(self, path):
+        "Return true if a file is one of those in the vocabulary."
+
+        return path in self.prefixes
+
+    def is_fresh(self):
+        "Return true if none of the files have changed since loading."
+
+        try:
+            return _signature(self.paths) == self.signature
+        except OSError:
+            return False
+
+
+# Vocabularies already loaded by this process, keyed by bundles
+_vocabularies = {}
+
+
+def load_vocabulary(bundles, cache_path=None):
+    """Return a vocabulary of bundles, loaded from a cache file if possible.
+
+    The cache is a pickle, so it must only be written by this function.  It
+    is rebuilt if any of the files it was loaded from have changed.  Loaded
+    vocabularies are also kept in memory, so a process that runs several
+    tools only loads each one once.
+    """
+
+    bundles = sorted(os.path.abspath(b) for b in bundles)
+    paths = _turtle_files(bundles)
+    vocabulary = _vocabularies.get(tuple(bundles))
+    if vocabulary is not None and vocabulary.paths == paths:
+        if vocabulary.is_fresh():
+            return vocabulary
+
+    if cache_path is not None:
+        try:
+            with open(cache_path, "rb") as cache_file:
+                vocabulary = pickle.load(cache_file)
+
+            if (
+                getattr(vocabulary, "format", None) == VOCABULARY_FORMAT
+                and vocabulary.paths == paths
+                and vocabulary.is_fresh()
+            ):
+                _vocabularies[tuple(bundles)] = vocabulary
+                return vocabulary
+        except (
+            OSError,
+            EOFError,
+            AttributeError,
+            ImportError,
+            pickle.PickleError,
+        ):
+            pass
+
+    vocabulary = Vocabulary(bundles)
+
+    if cache_path is not None:
+        # Replace the cache atomically, since several tools may share it
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump(vocabulary, cache_file, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_path, cache_path)
+
+    _vocabularies[tuple(bundles)] = vocabulary
+    return vocabulary
+
+
+class _UnionView(rdflib.graph.ReadOnlyGraphAggregate):
+    """A read-only view of several graphs as one, like a graph of them all.
+
+    Like a single graph, this has no duplicates, so a triple that is in
+    several graphs is only returned once.
+    """
+
+    def triples(self, triple):
+        if len(self.graphs) == 1:
+            yield from self.graphs[0].triples(triple)
+            return
+
+        seen = set()
+        for result in super().triples(triple):
+            if result not in seen:
+                seen.add(result)
+                yield result
+
+
+class World:
+    """A lazily loaded model of a set of bundles.
+
+    The manifests of all bundles are parsed into a single model when they are
+    added.  Data files are parsed into the same model by load(), so the
+    result of load() can be queried like any other model.
+
+    If a base vocabulary is given, then the model is a read-only view of the
+    data parsed into this world, which is available separately as the data
+    attribute, and the vocabulary files it has loaded.  Files in the
+    vocabulary are never parsed again, their graphs are added to the view
+    and their prefixes are bound in the data.
+    """
+
+    def __init__(self, bundles=None, model=None, base=None):
+        self.data = rdflib.Graph() if model is None else model
+        self.base = base
+        self._loaded = set()
+
+        if base is None:
+            self.model = self.data
+        else:
+            self.model = _UnionView([self.data])
+            self.model.namespace_manager = self.data.namespace_manager
+
+        for bundle in bundles or []:
+            self.add_bundle(bundle)
+
+    def add_bundle(self, bundle):
+        "Parse the manifest of a bundle."
+
+        self.parse(os.path.join(bundle, "manifest.ttl"))
+
+    def parse(self, path):
+        "Parse a data file into the model if it is not already loaded."
+
+        path = os.path.abspath(path)
+        if path in self._loaded:
+            return
+
+        self._loaded.add(path)
+        if self.base is not None and self.base.contains(path):
+            self.model.graphs += [self.base.graphs[path]]
+            for prefix, uri in self.base.prefixes[path]:
+                self.data.bind(prefix, uri)
+            return
+
+        try:
+            self.data.parse(path, format="n3")
+        except SyntaxError:
+            sys.stderr.write(f"error: Failed to parse {path}\n")
+            raise
+
+    def files(self):
+        "Return a sorted list of the paths of all loaded files."
+
+        return sorted(self._loaded)
+
+    def subjects(self, rdf_type):
+        "Return a sorted list of all loaded subjects with a type."
+
+        return sorted(self.model.subjects(rdf.type, rdf_type))
+
+    def plugins(self):
+        "Return a sorted list of all plugins."
+
+        return self.subjects(lv2.Plugin)
+
+    def specifications(self):
+        "Return a sorted list of all specifications."
+
+        return self.subjects(lv2.Specification)
+
+    def _follow(self, subject):
+        "Parse every unloaded data file that subject refers to, repeatedly."
+
+        pending = True
+        while pending:
+            pending = False
+            for uri in list(self.model.objects(subject, rdfs.seeAlso)):
+                path = _local_path(uri)
+                if path is not None and path not in self._loaded:
+                    self.parse(path)
+                    pending = True
+
+        return self.model
+
+    def load(self, subject):
+        "Load all data files about a subject and return the model."
+
+        return self._follow(subject)
+
+    def load_all(self):
+        "Load every data file of every subject and return the model."
+
+        return self._follow(None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... [BUNDLE_OR_DIR]...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "paths",
+        nargs="*",
+        metavar="BUNDLE_OR_DIR",
+        help="bundle or directory of bundles (default: LV2_PATH)",
+    )
+
+    args = ap.parse_args(sys.argv[1:])
+    world = World(find_bundles(args.paths or lv2_path()))
+
+    for specification in world.specifications():
+        print(f"specification {specification}")
+
+    for plugin in world.plugins():
+        print(f"plugin {plugin}")
@@ -3,8 +3,11 @@
 # Copyright 2012 David Robillard <d@drobilla.net>
 # SPDX-License-Identifier: ISC
 
-import errno
+import argparse
+import concurrent.futures
+import hashlib
 import os
+import sqlite3
 import sys
 
 __date__ = "2012-03-27"
@@ -18,6 +21,8 @@ try:
 except ImportError:
     sys.exit("Error importing rdflib")
 
+import lv2bundles
+
 doap = rdflib.Namespace("http://usefulinc.com/ns/doap#")
 lv2 = rdflib.Namespace("http://lv2plug.in/ns/lv2core#")
 rdf = rdflib.Namespace("http://www.w3.org/1999/02/22-rdf-syntax-ns#")
@@ -34,47 +39,150 @@ def uri_to_path(uri):
 
 def get_doc(model, subject):
     comment = model.value(subject, rdfs.comment, None)
+    return comment_doc(comment)
+
+
+def comment_doc(comment):
     if comment:
         return '<p class="content">%s</p>' % comment
     return ""
 
 
-def port_doc(model, port):
-    name = model.value(port, lv2.name, None)
+def port_doc(name, comment):
     html = '<div class="specterm"><h3>%s</h3>' % name
-    html += get_doc(model, port)
+    html += comment_doc(comment)
     html += "</div>"
     return html
 
 
-def plugin_doc(model, plugin, style_uri):
-    uri = str(plugin)
-    name = model.value(plugin, doap.name, None)
+def _text(node):
+    return None if node is None else str(node)
+
+
+def _types(model, subject):
+    return sorted(str(t) for t in model.objects(subject, rdf.type))
+
+
+def _port_index(model, port):
+    "Return the lv2:index of a port, or None if it has no valid index."
+
+    try:
+        return int(model.value(port, lv2["index"], None, any=False))
+    except (TypeError, ValueError, rdflib.exceptions.UniquenessError):
+        return None
+
+
+def _language_rank(literal):
+    "Return how preferable a literal is for an English page, lowest first."
+
+    language = getattr(literal, "language", None)
+    if not language:
+        return 0
+    if language == "en" or language.startswith("en-"):
+        return 1
+    return 2
+
+
+def preferred_literal(literals):
+    "Return the untagged or English literal if any, or another, or None."
+
+    literals = list(literals)
+    if not literals:
+        return None
+
+    return min(literals, key=lambda x: (_language_rank(x), str(x)))
+
+
+def text_table(model, predicate):
+    """Return a dictionary of the preferred text of every subject.
+
+    Untagged or English literals are used if a subject has any, and only
+    otherwise one in another language, as with preferred_literal().
+    """
+
+    values = {}
+    for subject, value in model.subject_objects(predicate):
+        values.setdefault(subject, []).append(value)
+
+    return {s: preferred_literal(v) for s, v in values.items()}
+
+
+def plugin_record(model, plugin, names=None, comments=None):
+    """Return a dictionary of everything documented about a plugin.
+
+    Ports are ordered by lv2:index, and those without a valid index, which
+    have an index of None, come last.
+    """
+
+    # Look up all names and comments at once rather than for every port
+    if names is None:
+        names = text_table(model, lv2.name)
+    if comments is None:
+        comments = text_table(model, rdfs.comment)
+
+    ports = []
+    for port in model.objects(plugin, lv2.port):
+        index = _port_index(model, port)
+        if index is None:
+            sys.stderr.write(
+                "warning: Port %s of <%s> has no valid lv2:index,"
+                " listing it last\n" % (port, plugin)
+            )
+
+        ports += [
+            {
+                "index": index,
+                "name": _text(names.get(port)),
+                "comment": _text(comments.get(port)),
+                "types": _types(model, port),
+            }
+        ]
+
+    return {
+        "uri": str(plugin),
+        "name": _text(preferred_literal(model.objects(plugin, doap.name))),
+        "comment": _text(comments.get(plugin)),
+        "types": _types(model, plugin),
+        "ports": sorted(ports, key=_port_order),
+    }
+
+
+def _port_order(port):
+    "Return a key to sort ports by index, with unindexed ports last."
+
+    index = port["index"]
+    return (
+        index is None,
+        index or 0,
+        port["name"] or "",
+        port["comment"] or "",
+    )
+
+
+def record_doc(record, style_uri):
+    "Return the HTML documentation for a plugin record."
+
+    uri = record["uri"]
+    name = record["name"]
 
     dtd = "http://www.w3.org/MarkUp/DTD/xhtml-rdfa-1.dtd"
-    html = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML+RDFa 1.0//EN" %s>
+    html = ["""<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML+RDFa 1.0//EN" "%s">
 <html about="%s"
       xmlns="http://www.w3.org/1999/xhtml"
       xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
       xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
       xmlns:lv2="http://lv2plug.in/ns/lv2core#"
-      xml:lang="en">""" % (
-        uri,
-        dtd,
-    )
+      xml:lang="en">""" % (dtd, uri)]
 
-    html += """<head>
+    html += ["""<head>
     <title>%s</title>
     <meta http-equiv="content-type" content="text/xhtml+xml; charset=utf-8" />
     <meta name="generator" content="lv2docgen" />
     <link href="%s" rel="stylesheet" type="text/css" />
   </head>
-  <body>""" % (
-        name,
-        style_uri,
-    )
+  <body>""" % (name, style_uri)]
 
-    html += """
+    html += ["""
   <!-- HEADER -->
   <div id="header">
     <h1 id="title">%s</h1>
@@ -83,62 +191,464 @@ def plugin_doc(model, plugin, style_uri):
       <tr><th>Version</th><td>%s</td></tr>
     </table>
   </div>
-""" % (
-        name,
-        uri,
-        uri,
-        "0.0.0",
-    )
+""" % (name, uri, uri, "0.0.0")]
 
-    html += get_doc(model, plugin)
+    html += [comment_doc(record["comment"])]
 
-    ports_html = ""
-    for p in model.triples([plugin, lv2.port, None]):
-        ports_html += port_doc(model, p[2])
+    ports_html = [port_doc(p["name"], p["comment"]) for p in record["ports"]]
 
-    if len(ports_html):
-        html += (
-            """
+    if ports_html:
+        html += ["""
   <h2 class="sec">Ports</h2>
   <div class="content">
 %s
-  </div>"""
-            % ports_html
+  </div>""" % "".join(ports_html)]
+
+    html += ["  </body></html>"]
+    return "".join(html)
+
+
+def plugin_doc(model, plugin, style_uri, names=None, comments=None):
+    return record_doc(plugin_record(model, plugin, names, comments), style_uri)
+
+
+def world_records(world):
+    "Return records for every plugin in a world."
+
+    # Load only the data about plugins, not presets or other resources
+    plugins = world.plugins()
+    for plugin in plugins:
+        world.load(plugin)
+
+    model = world.model
+    names = text_table(model, lv2.name)
+    comments = text_table(model, rdfs.comment)
+
+    return [plugin_record(model, p, names, comments) for p in plugins]
+
+
+def file_signature(path):
+    "Return the (path, mtime_ns, size, sha256) signature of a file."
+
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    return (path, stat.st_mtime_ns, stat.st_size, digest)
+
+
+def world_prefixes(world):
+    "Return a dictionary of the namespace prefixes bound in a world."
+
+    return {
+        str(prefix): str(uri)
+        for prefix, uri in world.model.namespace_manager.namespaces()
+    }
+
+
+def bundle_records(bundle):
+    """Load a single bundle.
+
+    Returns the signatures of the files that were loaded, the plugin
+    records, and the namespace prefixes used in the data.
+    """
+
+    world = lv2bundles.World([bundle])
+    records = world_records(world)
+    signatures = [file_signature(f) for f in world.files()]
+    return signatures, records, world_prefixes(world)
+
+
+class PluginCache:
+    """SQLite cache of the plugin records in bundles.
+
+    The files that were loaded for each bundle are stored with their
+    modification time, size, and hash, so a bundle is only reloaded if one of
+    them has changed.  A file with a new modification time but the same
+    contents does not count as a change.
+    """
+
+    version = 4
+    tables = [
+        "files",
+        "prefixes",
+        "plugins",
+        "plugin_types",
+        "ports",
+        "port_types",
+    ]
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        if (
+            self.db.execute("PRAGMA user_version").fetchone()[0]
+            != self.version
+        ):
+            for table in self.tables:
+                self.db.execute("DROP TABLE IF EXISTS %s" % table)
+            self.db.execute("PRAGMA user_version = %d" % self.version)
+
+        self.db.executescript("""
+CREATE TABLE IF NOT EXISTS files (
+  bundle TEXT NOT NULL,
+  path TEXT NOT NULL PRIMARY KEY,
+  mtime_ns INTEGER NOT NULL,
+  size INTEGER NOT NULL,
+  sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prefixes (
+  bundle TEXT NOT NULL,
+  prefix TEXT NOT NULL,
+  namespace TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plugins (
+  uri TEXT NOT NULL PRIMARY KEY,
+  bundle TEXT NOT NULL,
+  name TEXT,
+  comment TEXT
+);
+CREATE TABLE IF NOT EXISTS plugin_types (
+  plugin TEXT NOT NULL,
+  type TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ports (
+  plugin TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  port_index INTEGER,
+  name TEXT,
+  comment TEXT,
+  PRIMARY KEY (plugin, position)
+);
+CREATE TABLE IF NOT EXISTS port_types (
+  plugin TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_bundle ON files (bundle);
+CREATE INDEX IF NOT EXISTS prefixes_bundle ON prefixes (bundle);
+CREATE INDEX IF NOT EXISTS plugins_bundle ON plugins (bundle);
+CREATE INDEX IF NOT EXISTS plugin_types_type ON plugin_types (type);
+CREATE INDEX IF NOT EXISTS port_types_type ON port_types (type);
+""")
+
+    def close(self):
+        self.db.close()
+
+    def is_fresh(self, bundle):
+        "Return true if the cached data for a bundle is up to date."
+
+        rows = self.db.execute(
+            "SELECT path, mtime_ns, size, sha256 FROM files WHERE bundle = ?",
+            (bundle,),
+        ).fetchall()
+
+        if not rows:
+            return False
+
+        for path, mtime_ns, size, sha256 in rows:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+
+            if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+                continue
+
+            signature = file_signature(path)
+            if signature[3] != sha256:
+                return False
+
+            # Only touched, so remember the new time to skip hashing next time
+            self.db.execute(
+                "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                (signature[1], signature[2], path),
+            )
+
+        return True
+
+    def update(self, bundle, signatures, records, prefixes):
+        "Replace the cached data for a bundle."
+
+        db = self.db
+        with db:
+            uris = [
+                row[0]
+                for row in db.execute(
+                    "SELECT uri FROM plugins WHERE bundle = ?", (bundle,)
+                )
+            ]
+            uris += [r["uri"] for r in records]
+            for uri in uris:
+                for table in ["plugin_types", "ports", "port_types"]:
+                    db.execute(
+                        "DELETE FROM %s WHERE plugin = ?" % table, (uri,)
+                    )
+
+            db.execute("DELETE FROM plugins WHERE bundle = ?", (bundle,))
+            db.execute("DELETE FROM files WHERE bundle = ?", (bundle,))
+            db.execute("DELETE FROM prefixes WHERE bundle = ?", (bundle,))
+
+            db.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                [(bundle,) + tuple(s) for s in signatures],
+            )
+            db.executemany(
+                "INSERT INTO prefixes VALUES (?, ?, ?)",
+                [(bundle, p, n) for p, n in sorted(prefixes.items())],
+            )
+
+            for r in records:
+                uri = r["uri"]
+                db.execute(
+                    "INSERT OR REPLACE INTO plugins VALUES (?, ?, ?, ?)",
+                    (uri, bundle, r["name"], r["comment"]),
+                )
+                db.executemany(
+                    "INSERT INTO plugin_types VALUES (?, ?)",
+                    [(uri, t) for t in r["types"]],
+                )
+                for i, port in enumerate(r["ports"]):
+                    db.execute(
+                        "INSERT INTO ports VALUES (?, ?, ?, ?, ?)",
+                        (uri, i, port["index"], port["name"], port["comment"]),
+                    )
+                    db.executemany(
+                        "INSERT INTO port_types VALUES (?, ?, ?)",
+                        [(uri, i, t) for t in port["types"]],
+                    )
+
+    def prefixes(self, bundles):
+        "Return the namespace prefixes used in the data of bundles."
+
+        bundles = set(bundles)
+        rows = self.db.execute(
+            "SELECT bundle, prefix, namespace FROM prefixes"
+            " ORDER BY bundle, prefix"
         )
 
-    html += "  </body></html>"
-    return html
+        return {p: n for b, p, n in rows.fetchall() if b in bundles}
+
+    def records(self, bundles, port_type=None):
+        "Return the cached records for plugins in bundles."
+
+        db = self.db
+        if port_type is None:
+            rows = db.execute("SELECT uri, bundle, name, comment FROM plugins")
+        else:
+            rows = db.execute(
+                "SELECT uri, bundle, name, comment FROM plugins"
+                " WHERE uri IN"
+                " (SELECT plugin FROM port_types WHERE type = ?)",
+                (port_type,),
+            )
+
+        bundles = set(bundles)
+        records = []
+        for uri, bundle, name, comment in sorted(rows.fetchall()):
+            if bundle not in bundles:
+                continue
+
+            types = [
+                row[0]
+                for row in db.execute(
+                    "SELECT type FROM plugin_types WHERE plugin = ?"
+                    " ORDER BY type",
+                    (uri,),
+                )
+            ]
+
+            ports = []
+            port_rows = db.execute(
+                "SELECT position, port_index, name, comment FROM ports"
+                " WHERE plugin = ? ORDER BY position",
+                (uri,),
+            ).fetchall()
+            for position, index, port_name, port_comment in port_rows:
+                port_types = db.execute(
+                    "SELECT type FROM port_types"
+                    " WHERE plugin = ? AND position = ? ORDER BY type",
+                    (uri, position),
+                )
+                ports += [
+                    {
+                        "index": index,
+                        "name": port_name,
+                        "comment": port_comment,
+                        "types": [row[0] for row in port_types],
+                    }
+                ]
+
+            records += [
+                {
+                    "uri": uri,
+                    "name": name,
+                    "comment": comment,
+                    "types": types,
+                    "ports": ports,
+                }
+            ]
+
+        return records
+
+
+def has_port_type(record, port_type):
+    return any(port_type in p["types"] for p in record["ports"])
+
+
+def expand_name(name, prefixes):
+    """Return the URI for a prefixed name or URI, or raise KeyError.
+
+    Prefixes is a dictionary of namespaces, like that of world_prefixes().
+    """
+
+    if name.startswith("<") and name.endswith(">"):
+        return name[1:-1]
+
+    if "://" in name:
+        return name
+
+    prefix, _, local = name.partition(":")
+    if prefix not in prefixes:
+        raise KeyError("Unknown prefix '%s:'" % prefix)
+
+    return prefixes[prefix] + local
+
+
+def load_records(bundles, cache=None, port_type=None):
+    """Return records for all plugins in bundles, using a cache if given.
+
+    The port type may be a prefixed name, with a prefix used in the data,
+    and raises KeyError if it can't be expanded.
+    """
+
+    stale = bundles
+    if cache is not None:
+        stale = [b for b in bundles if not cache.is_fresh(b)]
+
+    records = []
+    prefixes = {}
+
+    # Load each bundle separately, so only one is loaded per process
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        jobs = [executor.submit(bundle_records, b) for b in stale]
+
+        for bundle, job in zip(stale, jobs):
+            try:
+                signatures, found, found_prefixes = job.result()
+            except Exception as e:
+                sys.stderr.write(
+                    "error: Failed to load %s: %s\n" % (bundle, e)
+                )
+                continue
+
+            if cache is not None:
+                cache.update(bundle, signatures, found, found_prefixes)
+            else:
+                records += found
+                prefixes.update(found_prefixes)
+
+    if cache is not None:
+        cache.db.commit()
+        if port_type is not None:
+            port_type = expand_name(port_type, cache.prefixes(bundles))
+
+        return cache.records(bundles, port_type)
+
+    if port_type is not None:
+        port_type = expand_name(port_type, prefixes)
+        records = [r for r in records if has_port_type(r, port_type)]
+
+    return records
+
+
+def write_docs(records, outdir, style_uri):
+    """Write documentation for plugin records.
+
+    Pages that are already up to date are not written, so their modification
+    times are preserved.  Returns a list of (plugin, path, written) tuples.
+    """
+
+    results = []
+    for record in sorted(records, key=lambda r: r["uri"]):
+        html = record_doc(record, style_uri).encode("utf-8")
+        outpath = os.path.join(outdir, uri_to_path(record["uri"]) + ".html")
+
+        os.makedirs(os.path.dirname(outpath), exist_ok=True)
+        written = lv2bundles.write_if_changed(outpath, html)
+
+        results.append((record["uri"], outpath, written))
+
+    return results
 
 
 if __name__ == "__main__":
     "LV2 plugin documentation generator"
 
-    if len(sys.argv) < 2:
-        print("Usage: %s OUTDIR FILE..." % sys.argv[0])
-        sys.exit(1)
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... OUTDIR [BUNDLE_OR_FILE]...",
+        description="Document all plugins in LV2_PATH if no inputs are given.",
+    )
+
+    ap.add_argument("--cache", help="SQLite cache of bundle data")
+    ap.add_argument(
+        "--port-type",
+        help="only document plugins with a port of this type, which may be"
+        " a URI or a prefixed name like atom:AtomPort",
+    )
+    ap.add_argument("outdir", metavar="OUTDIR", help="output directory")
+    ap.add_argument(
+        "inputs",
+        nargs="*",
+        metavar="BUNDLE_OR_FILE",
+        help="bundle, directory of bundles, or data file",
+    )
 
-    outdir = sys.argv[1]
-    files = sys.argv[2:]
-    model = rdflib.ConjunctiveGraph()
-    for f in files:
-        model.parse(f, format="n3")
+    args = ap.parse_args(sys.argv[1:])
+    style_uri = os.path.abspath(os.path.join(args.outdir, "style.css"))
 
-    style_uri = os.path.abspath(os.path.join(outdir, "style.css"))
-    for p in model.triples([None, rdf.type, lv2.Plugin]):
-        plugin = p[0]
-        html = plugin_doc(model, plugin, style_uri)
-        path = uri_to_path(plugin)
+    records = []
+    files = [i for i in args.inputs if not os.path.isdir(i)]
+    if files:
+        # Document the data in all given files together
+        world = lv2bundles.World()
+        for f in files:
+            world.parse(f)
 
-        outpath = os.path.join(outdir, path + ".html")
+        records += world_records(world)
+        if args.port_type is not None:
+            try:
+                port_type = expand_name(args.port_type, world_prefixes(world))
+            except KeyError as e:
+                sys.exit("error: %s" % e.args[0])
+
+            records = [r for r in records if has_port_type(r, port_type)]
+
+    directories = [i for i in args.inputs if os.path.isdir(i)]
+    if not args.inputs:
+        directories = lv2bundles.lv2_path()
+
+    if directories:
+        cache = PluginCache(args.cache) if args.cache else None
+        bundles = lv2bundles.find_bundles(directories)
         try:
-            os.makedirs(os.path.dirname(outpath))
-        except OSError:
-            e = sys.exc_info()[1]
-            if e.errno == errno.EEXIST:
-                pass
-            else:
-                raise
+            records += load_records(bundles, cache, args.port_type)
+        except KeyError as e:
+            sys.exit("error: %s" % e.args[0])
+        finally:
+            if cache is not None:
+                cache.close()
 
-            print("Writing <%s> documentation to %s" % (plugin, outpath))
-            with open(outpath, "w") as out:
-                out.write(html)
+    if args.port_type is not None and not records:
+        sys.exit("error: No plugins have a port of type %s" % args.port_type)
+
+    n_written = 0
+    results = write_docs(records, args.outdir, style_uri)
+    for plugin, outpath, written in results:
+        if written:
+            print("Wrote <%s> documentation to %s" % (plugin, outpath))
+            n_written += 1
+
+    print(
+        "%d pages written, %d unchanged"
+        % (n_written, len(results) - n_written)
+    )
@@ -9,9 +9,14 @@
 # Based on SpecGen:
 # <http://forge.morfeo-project.org/wiki_en/index.php/SpecGen>
 
+import concurrent.futures
 import datetime
+import functools
+import hashlib
+import json
 import markdown
 import markdown.extensions
+import multiprocessing
 import optparse
 import os
 import re
@@ -54,6 +59,35 @@ try:
 except ImportError:
     sys.exit("Error importing rdflib")
 
+
+def _path_from_env(variable, default):
+    value = os.environ.get(variable)
+    return value if value and os.path.isabs(value) else default
+
+
+def _paths_from_env(variable, default):
+    paths = []
+    value = os.environ.get(variable)
+    if value:
+        paths = [p for p in value.split(os.pathsep) if os.path.isabs(p)]
+
+    return paths if paths else default
+
+
+def _data_dirs():
+    return _paths_from_env(
+        "XDG_DATA_DIRS", ["/usr/local/share/", "/usr/share/"]
+    )
+
+
+# Use lv2bundles.py next to this script, or installed with the lv2specgen data
+sys.path += [os.path.join(d, "lv2specgen") for d in _data_dirs()]
+
+try:
+    import lv2bundles
+except ImportError:
+    sys.exit("Error importing lv2bundles")
+
 # Global Variables
 classranges = {}
 classdomains = {}
@@ -63,8 +97,16 @@ spec_ns_str = None
 spec_ns = None
 spec_pre = None
 spec_bundle = None
+spec_files = []
+spec_metadata = None
 specgendir = None
-ns_list = {
+term_doc_cache = None
+term_doc_cache_size = 4096  # Several times the terms in every LV2 spec
+vocabulary = None
+link_namespaces = {}
+link_terms = set()
+link_pattern = None
+default_ns_list = {
     "http://purl.org/dc/terms/": "dcterms",
     "http://usefulinc.com/ns/doap#": "doap",
     "http://xmlns.com/foaf/0.1/": "foaf",
@@ -73,6 +115,7 @@ ns_list = {
     "http://www.w3.org/2000/01/rdf-schema#": "rdfs",
     "http://www.w3.org/2001/XMLSchema#": "xsd",
 }
+ns_list = dict(default_ns_list)
 
 rdf = rdflib.Namespace("http://www.w3.org/1999/02/22-rdf-syntax-ns#")
 rdfs = rdflib.Namespace("http://www.w3.org/2000/01/rdf-schema#")
@@ -122,15 +165,30 @@ def isLiteral(n):
     return isinstance(n, rdflib.Literal)
 
 
+# Pattern to split a URI into a namespace and a local name
+uri_parts_pattern = re.compile("^(.*[/#])([^/#]+)$")
+
+# Pattern for prefixed names like eg:Thing
+prefixed_name_pattern = re.compile(
+    "(?P<prefix>[a-zA-Z0-9_-]+):(?P<name>[a-zA-Z0-9_-]+)"
+)
+
+# Size of the caches for term names and links
+term_cache_size = 4096
+
+
 def niceName(uri):
-    global spec_bundle
-    if uri.startswith(spec_ns_str):
-        return uri.replace(spec_ns_str, "")
+    return cachedNiceName(uri, spec_ns_str)
+
+
+@functools.lru_cache(maxsize=term_cache_size)
+def cachedNiceName(uri, ns_str):
+    if uri.startswith(ns_str):
+        return uri.replace(ns_str, "")
     elif uri == str(rdfs.seeAlso):
         return "See also"
 
-    regexp = re.compile("^(.*[/#])([^/#]+)$")
-    rez = regexp.search(uri)
+    rez = uri_parts_pattern.search(uri)
     if not rez:
         return uri
     pref = rez.group(1)
@@ -175,34 +233,155 @@ def linkifyCodeIdentifiers(string):
     return rgx.sub(translateCodeLink, string)
 
 
-def linkifyVocabIdentifiers(m, string, classlist, proplist, instalist):
-    "Add links to vocabulary documentation for prefixed names like eg:Thing"
+def compileLinkPattern():
+    """Return the pattern for all the kinds of link that linkify() adds"""
 
-    rgx = re.compile("([a-zA-Z0-9_-]+):([a-zA-Z0-9_-]+)")
-    namespaces = getNamespaces(m)
+    codes = "|".join(map(re.escape, linkmap)) if linkmap else "(?!)"
+
+    code = "(?<=[^a-zA-Z0-9_:])(?P<code>%s)(?=[^a-zA-Z0-9_:])" % codes
+    local = "(?P<space>[ \t\n\r\f\v^]+)#(?P<local>[a-zA-Z0-9_-]+)"
+    local += "(?::(?P<after>[a-zA-Z0-9_-]+))?"
+
+    return re.compile("|".join([code, prefixed_name_pattern.pattern, local]))
+
+
+def setLinkTables(namespaces, terms):
+    """Set the namespaces and terms that linkify() uses for a specification"""
+    global link_namespaces
+    global link_terms
+    global link_pattern
+
+    link_namespaces = namespaces
+    link_terms = set(terms)
+    link_pattern = compileLinkPattern()
+
+
+def linkify(string, local=False):
+    """Add links for code identifiers, prefixed names, and #names if local.
+
+    This is a single pass over the string that gives the same results as
+    linkifying code identifiers, then prefixed names, then local names.
+    Since code identifiers are linked first, a name that contains one is cut
+    short where it starts, and the scan continues from there.
+    """
+
+    if string in linkmap:
+        # Exact match for complete string
+        return linkmap[string]
+
+    pieces = []
+    local_warnings = []
+    code_end = None  # End of the last code link, which owns the next char
+
+    def isCodeAt(i):
+        match = link_pattern.match(string, i)
+        return match is not None and match.group("code") is not None
+
+    def findCodeStop(start, end):
+        "Return where a linked code identifier starts after a dash, or None"
+        i = string.find("-", start, end - 1)
+        while i != -1:
+            if i != code_end and isCodeAt(i + 1):
+                return i + 1
+            i = string.find("-", i + 1, end - 1)
+        return None
 
-    def translateLink(match):
-        text = match.group(0)
-        prefix = match.group(1)
-        name = match.group(2)
-        uri = rdflib.URIRef(spec_ns + name)
+    def linkPrefixedName(text, prefix, name):
         if prefix == spec_pre:
-            if not (
-                (classlist and uri in classlist)
-                or (instalist and uri in instalist)
-                or (proplist and uri in proplist)
-            ):
+            if rdflib.URIRef(spec_ns + name) not in link_terms:
                 print("warning: Link to undefined resource <%s>\n" % text)
             return '<a href="#%s">%s</a>' % (name, name)
-        elif prefix in namespaces:
+        elif prefix in link_namespaces:
             return '<a href="%s">%s</a>' % (
-                namespaces[match.group(1)] + match.group(2),
-                match.group(0),
+                link_namespaces[prefix] + name,
+                text,
             )
         else:
             return text
 
-    return rgx.sub(translateLink, string)
+    def translatePrefixedName(match):
+        start, end = match.span()
+        stop = findCodeStop(start, end)
+        if stop is not None and stop < match.end("prefix"):
+            pieces.append(string[start:stop])
+            return stop
+
+        end = end if stop is None else stop
+        name_start = match.start("name")
+        name = string[name_start:end]
+        text = string[start:end]
+        pieces.append(linkPrefixedName(text, match.group("prefix"), name))
+        return end
+
+    def translateLocalName(match):
+        start, end = match.span()
+        name_start = match.start("local")
+        if not local or isCodeAt(name_start):
+            pieces.append(string[start:name_start])
+            return name_start
+
+        space = match.group("space")
+        name = match.group("local")
+        after = match.group("after")
+        stop = findCodeStop(name_start, end)
+        if stop is not None:
+            end = stop
+            if stop <= match.end("local"):
+                name = string[name_start:stop]
+                after = None
+            else:
+                after_start = match.start("after")
+                after = string[after_start:stop]
+
+        if after is not None:
+            text = "%s:%s" % (name, after)
+            linked = linkPrefixedName(text, name, after)
+            if linked != text:
+                pieces.append("%s#%s" % (space, linked))
+                return end
+
+        if rdflib.URIRef(spec_ns + name) in link_terms:
+            pieces.append('%s<a href="#%s">%s</a>' % (space, name, name))
+        else:
+            local_warnings.append(name)
+            pieces.append("%s#%s" % (space, name))
+
+        if after is not None:
+            pieces.append(":" + after)
+
+        return end
+
+    pos = 0
+    match = link_pattern.search(string)
+    while match:
+        start = match.start()
+        pieces.append(string[pos:start])
+        code = match.group("code")
+        if code is None and match.group("prefix") is not None:
+            pos = translatePrefixedName(match)
+        elif code is None:
+            pos = translateLocalName(match)
+        elif start - 1 != code_end:
+            pieces.append(linkmap[code])
+            pos = code_end = match.end()
+        else:
+            # The delimiter was taken by the last link, so this is just text
+            name_match = prefixed_name_pattern.match(string, start)
+            if name_match:
+                pos = translatePrefixedName(name_match)
+            else:
+                pieces.append(code)
+                pos = match.end()
+
+        match = link_pattern.search(string, pos)
+
+    pieces.append(string[pos:])
+
+    # Warnings about local names come last, as if they were a separate pass
+    for name in local_warnings:
+        print("warning: Link to undefined resource <%s>\n" % name)
+
+    return "".join(pieces)
 
 
 def prettifyHtml(m, markup, subject, classlist, proplist, instalist):
@@ -236,31 +415,8 @@ def prettifyHtml(m, markup, subject, classlist, proplist, instalist):
             )
             markup = code_re.sub(code_str, markup, 1)
 
-    # Add links to code documentation for identifiers
-    markup = linkifyCodeIdentifiers(markup)
-
-    # Add internal links for known prefixed names
-    markup = linkifyVocabIdentifiers(m, markup, classlist, proplist, instalist)
-
-    # Transform names like #foo into links into this spec if possible
-    rgx = re.compile("([ \t\n\r\f\v^]+)#([a-zA-Z0-9_-]+)")
-
-    def translateLocalLink(match):
-        text = match.group(0)
-        space = match.group(1)
-        name = match.group(2)
-        uri = rdflib.URIRef(spec_ns + name)
-        if (
-            (classlist and uri in classlist)
-            or (instalist and uri in instalist)
-            or (proplist and uri in proplist)
-        ):
-            return '%s<a href="#%s">%s</a>' % (space, name, name)
-        else:
-            print("warning: Link to undefined resource <%s>\n" % name)
-            return text
-
-    markup = rgx.sub(translateLocalLink, markup)
+    # Add links for code identifiers, prefixed names, and names like #foo
+    markup = linkify(markup, True)
 
     if not have_lxml:
         print("warning: No Python lxml module found, output may be invalid")
@@ -319,9 +475,7 @@ def formatDoc(m, urinode, literal, classlist, proplist, instalist):
         return prettifyHtml(m, doc, urinode, classlist, proplist, instalist)
     else:
         doc = xml.sax.saxutils.escape(string)
-        doc = linkifyCodeIdentifiers(doc)
-        doc = linkifyVocabIdentifiers(m, doc, classlist, proplist, instalist)
-        return "<p>%s</p>" % doc
+        return "<p>%s</p>" % linkify(doc)
 
 
 def getComment(m, subject, classlist, proplist, instalist):
@@ -472,14 +626,40 @@ def getTermLink(uri, subject=None, predicate=None):
             niceName(str(predicate)),
             uri,
         )
-    if uri.startswith(spec_ns_str):
-        return '<a href="#%s" %s>%s</a>' % (
-            uri.replace(spec_ns_str, ""),
-            extra,
-            niceName(uri),
-        )
+
+    href, name = cachedTermLinkParts(uri, spec_ns_str)
+    return '<a href="%s" %s>%s</a>' % (href, extra, name)
+
+
+@functools.lru_cache(maxsize=term_cache_size)
+def cachedTermLinkParts(uri, ns_str):
+    "Return the link target and text for a term."
+    if uri.startswith(ns_str):
+        return "#" + uri.replace(ns_str, ""), cachedNiceName(uri, ns_str)
     else:
-        return '<a href="%s" %s>%s</a>' % (uri, extra, niceName(uri))
+        return uri, cachedNiceName(uri, ns_str)
+
+
+def clearTermCaches():
+    "Clear term caches, which depend on ns_list as well as their arguments."
+    cachedNiceName.cache_clear()
+    cachedTermLinkParts.cache_clear()
+
+
+def termCacheStats():
+    "Return a description of how effective the term caches have been."
+    lines = []
+    for name, f in [
+        ("niceName", cachedNiceName),
+        ("getTermLink", cachedTermLinkParts),
+    ]:
+        info = f.cache_info()
+        lines += [
+            "%s cache: %d hits, %d misses, %d/%d entries"
+            % (name, info.hits, info.misses, info.currsize, info.maxsize)
+        ]
+
+    return "\n".join(lines) + "\n"
 
 
 def owlRestrictionInfo(term, m):
@@ -726,67 +906,185 @@ def isDeprecated(m, subject):
     return deprecated and (str(deprecated[2]).find("true") >= 0)
 
 
-def docTerms(category, list, m, classlist, proplist, instalist):
+def docTerm(category, term, m, classlist, proplist, instalist):
     """
-    A wrapper class for listing all the terms in a specific class (either
-    Properties, or Classes. Category is 'Property' or 'Class', list is a
-    list of term URI strings, return value is a chunk of HTML.
+    Return a chunk of HTML that documents a single term.
     """
     doc = ""
-    for term in list:
-        if not term.startswith(spec_ns_str):
-            continue
+    t = termName(m, term)
+    curie = term.split(spec_ns_str[-1])[1]
+    if t:
+        doc += '<div class="specterm" id="%s" about="%s">' % (t, term)
+    else:
+        doc += '<div class="specterm" about="%s">' % term
 
-        t = termName(m, term)
-        curie = term.split(spec_ns_str[-1])[1]
-        if t:
-            doc += '<div class="specterm" id="%s" about="%s">' % (t, term)
-        else:
-            doc += '<div class="specterm" about="%s">' % term
+    doc += '<h3><a href="#%s">%s</a></h3>' % (getAnchor(term), curie)
+    doc += '<span class="spectermtype">%s</span>' % category
+
+    comment = getFullDocumentation(m, term, classlist, proplist, instalist)
+    is_deprecated = isDeprecated(m, term)
 
-        doc += '<h3><a href="#%s">%s</a></h3>' % (getAnchor(term), curie)
-        doc += '<span class="spectermtype">%s</span>' % category
+    doc += '<div class="spectermbody">'
 
-        comment = getFullDocumentation(m, term, classlist, proplist, instalist)
-        is_deprecated = isDeprecated(m, term)
+    terminfo = ""
+    extrainfo = ""
+    if category == "Property":
+        terminfo += rdfsPropertyInfo(term, m)
+        terminfo += owlInfo(term, m)
+    if category == "Class":
+        terminfo += rdfsClassInfo(term, m)
+        extrainfo += owlRestrictionInfo(term, m)
+    if category == "Instance":
+        terminfo += rdfsInstanceInfo(term, m)
 
-        doc += '<div class="spectermbody">'
+    terminfo += extraInfo(term, m)
 
-        terminfo = ""
-        extrainfo = ""
-        if category == "Property":
-            terminfo += rdfsPropertyInfo(term, m)
-            terminfo += owlInfo(term, m)
-        if category == "Class":
-            terminfo += rdfsClassInfo(term, m)
-            extrainfo += owlRestrictionInfo(term, m)
-        if category == "Instance":
-            terminfo += rdfsInstanceInfo(term, m)
+    if len(terminfo) > 0:  # to prevent empty list (bug #882)
+        doc += '\n<table class="terminfo">%s</table>\n' % terminfo
 
-        terminfo += extraInfo(term, m)
+    doc += '<div class="description">'
 
-        if len(terminfo) > 0:  # to prevent empty list (bug #882)
-            doc += '\n<table class="terminfo">%s</table>\n' % terminfo
+    if is_deprecated:
+        doc += '<div class="warning">Deprecated</div>'
 
-        doc += '<div class="description">'
+    if comment != "":
+        doc += (
+            '<div class="comment" property="rdfs:comment">%s</div>' % comment
+        )
 
-        if is_deprecated:
-            doc += '<div class="warning">Deprecated</div>'
+    doc += extrainfo
 
-        if comment != "":
-            doc += (
-                '<div class="comment" property="rdfs:comment">%s</div>'
-                % comment
+    doc += "</div>"
+
+    doc += "</div>"
+    doc += "\n</div>\n\n"
+
+    return doc
+
+
+# Arguments for docTerm in worker processes, inherited from the parent
+worker_doc_args = None
+
+
+def docTermInWorker(category, term):
+    return docTerm(category, term, *worker_doc_args)
+
+
+def nodeDescription(m, node, depth=0):
+    """
+    Return a string that describes a node independently of blank node IDs.
+
+    The description includes all properties of the node, and of any blank
+    nodes it refers to, but other named nodes are only referred to.
+    """
+    if depth > 0 and not isBlank(node):
+        return node.n3()
+    elif depth > 8:
+        return "[]"
+
+    return "[%s]" % " ; ".join(
+        sorted(
+            "%s %s" % (p.n3(), nodeDescription(m, o, depth + 1))
+            for p, o in m.predicate_objects(node)
+        )
+    )
+
+
+def termDigest(m, term, context):
+    """
+    Return a key for the documentation of a term that changes with its data.
+
+    This covers the term's own description, statements that refer to it,
+    and a context digest of everything else that is shared by all terms.
+    """
+    digest = hashlib.sha256(context.encode("utf-8"))
+    digest.update(nodeDescription(m, term).encode("utf-8"))
+    for s, p in sorted(m.subject_predicates(term)):
+        subject = "[]" if isBlank(s) else s.n3()
+        digest.update(("\n%s %s" % (subject, p.n3())).encode("utf-8"))
+
+    for table in [classdomains, classranges]:
+        digest.update(repr(sorted(table.get(str(term), []))).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def termContext(m, category, classlist, proplist, instalist):
+    "Return a string of all the shared inputs to rendering terms."
+    return repr(
+        (
+            category,
+            spec_ns_str,
+            spec_pre,
+            sorted(ns_list.items()),
+            sorted(getNamespaces(m).items()),
+            sorted(linkmap.items()),
+            classlist,
+            proplist,
+            instalist,
+        )
+    )
+
+
+def docTerms(category, list, m, classlist, proplist, instalist, jobs=1):
+    """
+    A wrapper class for listing all the terms in a specific class (either
+    Properties, or Classes. Category is 'Property' or 'Class', list is a
+    list of term URI strings, return value is a chunk of HTML.
+
+    If jobs is not 1, terms are rendered in that many forked processes (or
+    one per CPU if jobs is None), which all share a snapshot of the model.
+
+    If term_doc_cache is a dictionary, rendered terms are stored there, and
+    only terms whose data has changed since the last call are rendered.  The
+    least recently used terms are dropped once it holds more than
+    term_doc_cache_size terms.
+    """
+    global worker_doc_args
+
+    terms = [t for t in list if t.startswith(spec_ns_str)]
+    args = (m, classlist, proplist, instalist)
+
+    keys = [None] * len(terms)
+    docs = [None] * len(terms)
+    if term_doc_cache is not None:
+        context = termContext(m, category, classlist, proplist, instalist)
+        for i, term in enumerate(terms):
+            keys[i] = termDigest(m, term, context)
+            docs[i] = term_doc_cache.pop(keys[i], None)
+
+    missing = [i for i, doc in enumerate(docs) if doc is None]
+    missing_terms = [terms[i] for i in missing]
+
+    if (
+        jobs == 1
+        or len(missing) < 2
+        or "fork" not in multiprocessing.get_all_start_methods()
+    ):
+        rendered = [docTerm(category, t, *args) for t in missing_terms]
+    else:
+        # Fork workers after setting this so they inherit the current model
+        worker_doc_args = args
+        context = multiprocessing.get_context("fork")
+        with concurrent.futures.ProcessPoolExecutor(
+            jobs, mp_context=context
+        ) as executor:
+            rendered = executor.map(
+                functools.partial(docTermInWorker, category), missing_terms
             )
 
-        doc += extrainfo
+    for i, doc in zip(missing, rendered):
+        docs[i] = doc
 
-        doc += "</div>"
+    if term_doc_cache is not None:
+        # Insert every term again, so the oldest are the least recently used
+        for key, doc in zip(keys, docs):
+            term_doc_cache[key] = doc
 
-        doc += "</div>"
-        doc += "\n</div>\n\n"
+        while len(term_doc_cache) > term_doc_cache_size:
+            del term_doc_cache[next(iter(term_doc_cache))]
 
-    return doc
+    return "".join(docs)
 
 
 def getShortName(uri):
@@ -1135,6 +1433,21 @@ def load_tags(path, docdir):
     return linkmap
 
 
+def loadVocabulary(opts):
+    """Return the shared base vocabulary, reloading it if it has changed"""
+    global vocabulary
+
+    if not opts.get("vocabulary"):
+        return None
+
+    if vocabulary is None or not vocabulary.is_fresh():
+        vocabulary = lv2bundles.load_vocabulary(
+            opts["vocabulary"], opts.get("vocabulary_cache")
+        )
+
+    return vocabulary
+
+
 def specgen(
     specloc,
     template_path,
@@ -1154,9 +1467,20 @@ def specgen(
     global ns_list
     global specgendir
     global linkmap
+    global spec_files
+    global spec_metadata
 
     spec_bundle = "file://%s/" % os.path.abspath(os.path.dirname(specloc))
 
+    # Clear anything left from documenting another specification
+    spec_pre = opts.get("prefix")
+    spec_files = []
+    spec_metadata = None
+    ns_list = dict(default_ns_list)
+    classranges.clear()
+    classdomains.clear()
+    clearTermCaches()
+
     # Template
     with open(template_path, "r") as f:
         template = f.read()
@@ -1164,37 +1488,27 @@ def specgen(
     # Load code documentation link map from tags file
     linkmap = load_tags(tags, docdir)
 
-    m = rdflib.ConjunctiveGraph()
+    data = rdflib.ConjunctiveGraph()
 
     # RDFLib adds its own prefixes, so kludge around "time" prefix conflict
-    m.namespace_manager.bind(
+    data.namespace_manager.bind(
         "time", rdflib.URIRef("http://lv2plug.in/ns/ext/time#"), replace=True
     )
 
+    # Query the vocabulary and the data parsed for this spec as one model
+    world = lv2bundles.World(model=data, base=loadVocabulary(opts))
+    m = world.model
     manifest_path = os.path.join(os.path.dirname(specloc), "manifest.ttl")
     if os.path.exists(manifest_path):
-        m.parse(manifest_path, format="n3")
-    m.parse(specloc, format="n3")
+        world.parse(manifest_path)
+    world.parse(specloc)
 
     spec_url = getOntologyNS(m)
     spec = rdflib.URIRef(spec_url)
 
     # Load all seeAlso files recursively
-    seeAlso = set()
-    done = False
-    while not done:
-        done = True
-        for uri in specProperties(m, spec, rdfs.seeAlso):
-            if uri[:7] == "file://":
-                path = uri[7:]
-                if (
-                    path != os.path.abspath(specloc)
-                    and path.endswith("ttl")
-                    and path not in seeAlso
-                ):
-                    seeAlso.add(path)
-                    m.parse(path, format="n3")
-                    done = False
+    world.load(spec)
+    spec_files = world.files()
 
     spec_ns_str = spec_url
     if spec_ns_str[-1] != "/" and spec_ns_str[-1] != "#":
@@ -1224,6 +1538,7 @@ def specgen(
         sys.exit(1)
 
     ns_list[spec_ns_str] = spec_pre
+    clearTermCaches()
 
     classlist, proplist = specInformation(m, spec_ns_str)
     classlist = sorted(classlist)
@@ -1237,15 +1552,29 @@ def specgen(
         )
 
     azlist = buildIndex(m, classlist, proplist, instalist)
+    setLinkTables(namespaces, classlist + proplist + (instalist or []))
+
+    # Describe the specification for tools like the index builder
+    try:
+        spec_metadata = lv2bundles.specification_metadata(m, spec)
+        spec_metadata["bundle"] = os.path.dirname(os.path.abspath(specloc))
+        spec_metadata["classes"] = [str(c) for c in classlist]
+        spec_metadata["properties"] = [str(p) for p in proplist]
+        spec_metadata["instances"] = [str(i) for i in instalist or []]
+    except rdflib.exceptions.UniquenessError:
+        spec_metadata = None
 
     # Generate Term HTML
-    classlist = docTerms("Class", classlist, m, classlist, proplist, instalist)
+    jobs = opts.get("jobs", 1)
+    classlist = docTerms(
+        "Class", classlist, m, classlist, proplist, instalist, jobs
+    )
     proplist = docTerms(
-        "Property", proplist, m, classlist, proplist, instalist
+        "Property", proplist, m, classlist, proplist, instalist, jobs
     )
     if instances:
         instlist = docTerms(
-            "Instance", instalist, m, classlist, proplist, instalist
+            "Instance", instalist, m, classlist, proplist, instalist, jobs
         )
 
     termlist = ""
@@ -1353,13 +1682,17 @@ def specgen(
 
 
 def save(path, text):
+    """Write text to a file, unless it already contains exactly that text.
+
+    Returns true if the file was written.  Unchanged files are left alone, so
+    their modification time does not trigger rebuilds or uploads.
+    """
     try:
-        with open(path, "w") as f:
-            f.write(text)
-            f.flush()
+        return lv2bundles.write_if_changed(path, text)
     except Exception:
         e = sys.exc_info()[1]
         print('Error writing to file "' + path + '": ' + str(e))
+        return False
 
 
 def getNamespaces(m):
@@ -1387,28 +1720,112 @@ def getOntologyNS(m):
         return ns
 
 
-def usage():
-    script = os.path.basename(sys.argv[0])
-    return "Usage: %s ONTOLOGY_TTL OUTPUT_HTML [OPTION]..." % script
+def fileSignature(paths):
+    "Return the modification times of files, which change when they do."
+    signature = []
+    for path in paths:
+        try:
+            signature += [(path, os.stat(path).st_mtime_ns)]
+        except OSError:
+            signature += [(path, None)]
 
+    return signature
 
-def _path_from_env(variable, default):
-    value = os.environ.get(variable)
-    return value if value and os.path.isabs(value) else default
 
+class PageCache:
+    """Documentation pages for several specifications, rendered on demand.
 
-def _paths_from_env(variable, default):
-    paths = []
-    value = os.environ.get(variable)
-    if value:
-        paths = [p for p in value.split(os.pathsep) if os.path.isabs(p)]
+    Pages are rendered when requested, and rendered again only when one of
+    the files they were generated from has changed.  Rendered terms are
+    cached as well, so only terms whose data changed are rendered again.
+    """
 
-    return paths if paths else default
+    def __init__(self, specs, specgen_args):
+        global term_doc_cache
+
+        term_doc_cache = {}
+        self.specs = {specName(s): s for s in specs}
+        self.specgen_args = specgen_args
+        self.pages = {}  # Page name => (file signature, HTML)
+
+    def render(self, name):
+        cached = self.pages.get(name)
+        if cached and cached[0] == fileSignature([f for f, _ in cached[0]]):
+            return cached[1]
+
+        start = time.perf_counter()
+        html = specgen(self.specs[name], *self.specgen_args, instances=True)
+        self.pages[name] = (fileSignature(spec_files), html)
+        print(
+            "Rendered %s in %.3f s (%d cached terms)"
+            % (name, time.perf_counter() - start, len(term_doc_cache))
+        )
 
+        return html
 
-def _data_dirs():
-    return _paths_from_env(
-        "XDG_DATA_DIRS", ["/usr/local/share/", "/usr/share/"]
+
+def specName(specloc):
+    "Return the page name for a specification file, like atom for atom.ttl."
+    return os.path.splitext(os.path.basename(specloc))[0]
+
+
+def serve(specs, port, style_dir, specgen_args):
+    """Serve documentation for specs on localhost until interrupted."""
+    import http.server
+
+    pages = PageCache(specs, specgen_args)
+
+    def index():
+        links = "".join(
+            '<li><a href="%s.html">%s</a></li>' % (n, n)
+            for n in sorted(pages.specs)
+        )
+        return "<html><body><ul>%s</ul></body></html>" % links
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def send(self, status, content_type, text):
+            body = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?")[0].split("#")[0].lstrip("/")
+            name, extension = os.path.splitext(path)
+            if path == "":
+                self.send(200, "text/html; charset=utf-8", index())
+            elif path in ["pygments.css", "style.css"]:
+                with open(os.path.join(style_dir, path), "r") as f:
+                    self.send(200, "text/css; charset=utf-8", f.read())
+            elif extension == ".html" and name in pages.specs:
+                try:
+                    html = pages.render(name)
+                except (Exception, SystemExit) as e:
+                    self.send(500, "text/plain; charset=utf-8", str(e))
+                    return
+
+                self.send(200, "text/html; charset=utf-8", html)
+            else:
+                self.send(404, "text/plain; charset=utf-8", "Not found")
+
+    server = http.server.HTTPServer(("localhost", port), Handler)
+    print("Serving documentation at http://localhost:%d/" % port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def usage():
+    script = os.path.basename(sys.argv[0])
+    return (
+        "Usage: %s ONTOLOGY_TTL OUTPUT_HTML [OPTION]...\n"
+        "       %s --serve ONTOLOGY_TTL... [OPTION]..." % (script, script)
     )
 
 
@@ -1509,6 +1926,55 @@ if __name__ == "__main__":
         dest="instances",
         help="Document instances",
     )
+    opt.add_option(
+        "-j",
+        "--jobs",
+        type="int",
+        dest="jobs",
+        default=1,
+        help="Number of processes for rendering terms (0 for one per CPU)",
+    )
+    opt.add_option(
+        "--metadata",
+        type="string",
+        dest="metadata",
+        default=None,
+        help="Also write JSON metadata about the ontology to this file",
+    )
+    opt.add_option(
+        "--vocabulary",
+        type="string",
+        action="append",
+        dest="vocabulary",
+        default=[],
+        help="Bundle to load once as a shared base, like schemas.lv2",
+    )
+    opt.add_option(
+        "--vocabulary-cache",
+        type="string",
+        dest="vocabulary_cache",
+        default=None,
+        help="File to cache the parsed vocabulary bundles in",
+    )
+    opt.add_option(
+        "--serve",
+        action="store_true",
+        dest="serve",
+        help="Serve documentation for all given ontologies on localhost",
+    )
+    opt.add_option(
+        "--port",
+        type="int",
+        dest="port",
+        default=8000,
+        help="Port for --serve (default: 8000)",
+    )
+    opt.add_option(
+        "--profile",
+        action="store_true",
+        dest="profile",
+        help="Print profiling statistics to stderr",
+    )
     opt.add_option(
         "--copy-style",
         action="store_true",
@@ -1518,12 +1984,25 @@ if __name__ == "__main__":
 
     (options, args) = opt.parse_args()
     opts = vars(options)
+    if opts["jobs"] == 0:
+        opts["jobs"] = None
 
-    if len(args) < 2:
+    if len(args) < (1 if opts["serve"] else 2):
         opt.print_help()
         sys.exit(-1)
 
-    spec_pre = options.prefix
+    if opts["serve"]:
+        specgen_args = (
+            opts["template"],
+            opts["style_uri"],
+            options.docdir,
+            options.tags,
+            opts,
+        )
+
+        serve(args, opts["port"], opts["style_dir"], specgen_args)
+        sys.exit(0)
+
     ontology = "file:" + str(args[0])
     output = args[1]
     docdir = options.docdir
@@ -1542,26 +2021,43 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Generate spec documentation
-    specdoc = specgen(
+    specgen_args = (
         spec,
         opts["template"],
         opts["style_uri"],
         docdir,
         tags,
         opts,
-        instances=True,
     )
 
-    # Save to HTML output file
-    save(output, specdoc)
+    if opts["profile"]:
+        import cProfile
+        import pstats
 
-    if opts["copy_style"]:
-        import shutil
+        profiler = cProfile.Profile()
+        specdoc = profiler.runcall(specgen, *specgen_args, instances=True)
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(25)
+        sys.stderr.write(termCacheStats())
+    else:
+        specdoc = specgen(*specgen_args, instances=True)
 
+    # Save to HTML output file, and copy stylesheets if requested
+    outputs = [(output, specdoc)]
+    if opts["copy_style"]:
         for stylesheet in ["pygments.css", "style.css"]:
             style_dir = opts["style_dir"]
             output_dir = os.path.dirname(output)
-            shutil.copyfile(
-                os.path.join(style_dir, stylesheet),
-                os.path.join(output_dir, stylesheet),
-            )
+            with open(os.path.join(style_dir, stylesheet), "r") as f:
+                outputs += [(os.path.join(output_dir, stylesheet), f.read())]
+
+    if opts["metadata"] and spec_metadata is not None:
+        spec_metadata["files"] = lv2bundles.file_digests(spec_files)
+        text = json.dumps(spec_metadata, separators=(",", ":"), sort_keys=True)
+        outputs += [(opts["metadata"], text)]
+
+    for path, text in outputs:
+        if save(path, text):
+            print("Wrote %s" % path)
+        else:
+            print("Skipped unchanged %s" % path)
@@ -12,10 +12,22 @@ written in comments, which are emitted as paragraphs of regular text
 interleaved with code.  Asciidoc is both the comment and output syntax.
 """
 
+import argparse
+import concurrent.futures
+import hashlib
+import io
 import os
 import re
 import sys
 
+# Version of the output format, which must be changed when the output changes
+FORMAT_VERSION = 1
+
+_COMMENT_START = re.compile(r"/\*")
+_COMMENT_DELIMITER = re.compile(r"/\*|\*/")
+_STARS = re.compile(r"\**")
+_CACHE_NAME = re.compile(r"[0-9a-f]{64}\.txt(\.[0-9]+\.tmp)?")
+
 
 def format_text(text):
     "Format a text (comment) fragment and return it as a marked up string."
@@ -37,11 +49,9 @@ def format_code(lang, code):
 def format_c_source(filename, in_file):
     "Format an annotated C source file as a marked up string."
 
-    output = f"=== {os.path.basename(filename)} ===\n"
-    chunk = ""
-    prev_c = 0
+    output = [f"=== {os.path.basename(filename)} ===\n"]
+    chunk = []
     in_comment = False
-    in_comment_start = False
     n_stars = 0
     code = "".join(in_file)
 
@@ -51,38 +61,46 @@ def format_c_source(filename, in_file):
         code = code[end:]
 
     def last_chunk(chunk):
-        length = len(chunk) - 1
-        return chunk[0:length]
-
-    for char in code:
-        if prev_c == "/" and char == "*":
-            in_comment_start = True
-            n_stars = 1
-        elif in_comment_start:
-            if char == "*":
-                n_stars += 1
-            else:
-                if n_stars > 1:
-                    output += format_code("c", last_chunk(chunk))
-                    chunk = ""
-                    in_comment = True
-                else:
-                    chunk += "*" + char
-                in_comment_start = False
-        elif in_comment and prev_c == "*" and char == "/":
+        return "".join(chunk)[0:-1]
+
+    # Scan from one comment delimiter to the next, copying code in between
+    pos = 0
+    while True:
+        pattern = _COMMENT_DELIMITER if in_comment else _COMMENT_START
+        delimiter = pattern.search(code, max(pos - 1, 0))
+        if not delimiter:
+            chunk += [code[pos:]]
+            break
+
+        # Index of the second delimiter character (the one that is matched)
+        index = delimiter.start() + 1
+        chunk += [code[pos:index]]
+
+        if delimiter.group(0) == "/*":
+            n_stars = 1 + len(_STARS.match(code, index + 1).group(0))
+            after = index + n_stars
+            if after >= len(code):
+                break
+
             if n_stars > 1:
-                output += format_text(last_chunk(chunk))
+                output += [format_code("c", last_chunk(chunk))]
+                chunk = []
+                in_comment = True
             else:
-                output += format_code("c", "/* " + last_chunk(chunk) + "*/")
-            in_comment = False
-            in_comment_start = False
-            chunk = ""
+                chunk += ["*" + code[after]]
+
+            pos = after + 1
         else:
-            chunk += char
+            if n_stars > 1:
+                output += [format_text(last_chunk(chunk))]
+            else:
+                output += [format_code("c", "/* " + last_chunk(chunk) + "*/")]
 
-        prev_c = char
+            in_comment = False
+            chunk = []
+            pos = index + 1
 
-    return output + format_code("c", chunk)
+    return "".join(output) + format_code("c", "".join(chunk))
 
 
 def format_ttl_source(filename, in_file):
@@ -115,29 +133,137 @@ def format_ttl_source(filename, in_file):
     return output + format_code("turtle", chunk)
 
 
-def gen(out, filenames):
-    "Write markup generated from filenames to an output file."
+def format_source(filename, text):
+    "Format the text of a source file as a marked up string."
+
+    if filename.endswith(".c") or filename.endswith(".h"):
+        return format_c_source(filename, [text])
+
+    if filename.endswith(".ttl") or filename.endswith(".ttl.in"):
+        return format_ttl_source(filename, io.StringIO(text))
+
+    if filename.endswith(".txt"):
+        return text + "\n"
+
+    sys.stderr.write(
+        f"Unknown source format `{os.path.splitext(filename)[1]}`\n"
+    )
+    return ""
+
+
+def _cache_path(cache_dir, filename, text):
+    "Return the path of the cached markup for a source file."
+
+    digest = hashlib.sha256()
+    digest.update(f"{FORMAT_VERSION}:{os.path.basename(filename)}:".encode())
+    digest.update(text.encode("utf-8"))
+    return os.path.join(cache_dir, digest.hexdigest() + ".txt")
 
+
+def _prune_cache(cache_dir, paths):
+    "Remove any cached markup in cache_dir that isn't in paths."
+
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if _CACHE_NAME.fullmatch(name) and path not in paths:
+            os.remove(path)
+
+
+def write_if_changed(path, text):
+    """Write text to a file, unless it already has exactly that content.
+
+    This is like lv2bundles.write_if_changed(), which isn't used so that this
+    script only needs the standard library.  Returns true if the file was
+    written.
+    """
+
+    content = text.encode("utf-8")
+    try:
+        with open(path, "rb") as old_file:
+            unchanged = old_file.read() == content
+    except OSError:
+        unchanged = False
+
+    if unchanged:
+        return False
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as temporary_file:
+        temporary_file.write(content)
+
+    os.replace(temporary_path, path)
+    return True
+
+
+def gen(out, filenames, cache_dir=None, jobs=None):
+    """Write markup generated from filenames to an output file.
+
+    If cache_dir is given, the markup for each file is cached there, and only
+    files that have changed since the last run are formatted (in parallel).
+    Markup for versions of files that aren't in this run is removed.
+    """
+
+    texts = []
     for filename in filenames:
         with open(filename, "r", encoding="utf-8") as in_file:
-            if filename.endswith(".c") or filename.endswith(".h"):
-                out.write(format_c_source(filename, in_file))
-            elif filename.endswith(".ttl") or filename.endswith(".ttl.in"):
-                out.write(format_ttl_source(filename, in_file))
-            elif filename.endswith(".txt"):
-                for line in in_file:
-                    out.write(line)
-                out.write("\n")
-            else:
-                sys.stderr.write(
-                    f"Unknown source format `{filename.splitext()[1]}`\n"
-                )
+            texts += [in_file.read()]
+
+    # Load the markup for any unchanged files from the cache
+    fragments = [None] * len(filenames)
+    paths = [None] * len(filenames)
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        for i, filename in enumerate(filenames):
+            paths[i] = _cache_path(cache_dir, filename, texts[i])
+            if os.path.exists(paths[i]):
+                with open(paths[i], "r", encoding="utf-8") as cache_file:
+                    fragments[i] = cache_file.read()
+
+    # Format all other files, in parallel if there are several
+    missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+    if len(missing) > 1 and jobs != 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = executor.map(
+                format_source,
+                [filenames[i] for i in missing],
+                [texts[i] for i in missing],
+            )
+            for i, fragment in zip(missing, results):
+                fragments[i] = fragment
+    else:
+        for i in missing:
+            fragments[i] = format_source(filenames[i], texts[i])
+
+    if cache_dir is not None:
+        for i in missing:
+            write_if_changed(paths[i], fragments[i])
+
+        _prune_cache(cache_dir, set(paths))
+
+    for fragment in fragments:
+        out.write(fragment)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        sys.stderr.write(f"Usage: {sys.argv[0]} OUT_FILE IN_FILE...\n")
-        sys.exit(1)
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... OUT_FILE IN_FILE...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument("--cache-dir", help="directory to cache markup in")
+    ap.add_argument(
+        "-j", "--jobs", type=int, help="number of files to format in parallel"
+    )
+    ap.add_argument("OUT_FILE", help="output file")
+    ap.add_argument("IN_FILE", nargs="+", help="input source file")
+
+    args = ap.parse_args(sys.argv[1:])
 
-    with open(sys.argv[1], "w", encoding="utf-8") as out_file:
-        gen(out_file, sys.argv[2:])
+    # Leave the output untouched if nothing changed, to avoid rebuilds
+    markup = io.StringIO()
+    gen(markup, args.IN_FILE, args.cache_dir, args.jobs)
+    if write_if_changed(args.OUT_FILE, markup.getvalue()):
+        print(f"Wrote {args.OUT_FILE}")
+    else:
+        print(f"Skipped unchanged {args.OUT_FILE}")
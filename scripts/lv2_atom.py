@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Read and write LV2 atoms in raw buffers without copying.
+
+Buffers are anything that supports the buffer protocol, like bytes, a
+memoryview, or an mmap of a capture file, and are in the native byte order
+of the host that wrote them.  The layout is that of lv2/atom/atom.h: every
+atom has a 64-bit header of size and type, and bodies are padded to 64 bits.
+Atom bodies are returned as memoryview slices of the buffer, and the events
+of a sequence are read lazily, so even very large captures are never copied.
+
+A capture file is a series of padded atoms, for example one sequence for
+each cycle of a port buffer.  For bulk analysis, event_table() returns the
+time stamps, sizes, and types of all events in a sequence as a NumPy
+structured array, which is a view of the buffer if all events have the same
+size.
+
+Going the other way, encode_sequence() writes a sequence of many events from
+arrays of times, types, and bodies, with exactly the same result as the forge
+in lv2/atom/forge.h.  The check-forge command compares the two, given a
+program built from test/forge_sequence.c.
+"""
+
+import argparse
+import collections
+import importlib
+import mmap
+import struct
+import subprocess
+import sys
+
+# LV2_Atom: size, type
+ATOM_HEADER = struct.Struct("=II")
+
+# LV2_Atom_Event: time (frames or beats), body atom size, body atom type
+EVENT_HEADER = struct.Struct("=qII")
+BEATS_EVENT_HEADER = struct.Struct("=dII")
+
+# LV2_Atom_Sequence_Body, LV2_Atom_Object_Body: unit or id, pad or otype
+BODY_HEADER = struct.Struct("=II")
+
+# LV2_Atom_Sequence: size, type, unit, pad
+SEQUENCE_HEADER = struct.Struct("=IIII")
+
+# LV2_Atom_Property_Body: key, context, value atom size, value atom type
+PROPERTY_HEADER = struct.Struct("=IIII")
+
+Atom = collections.namedtuple("Atom", ["type", "body"])
+Event = collections.namedtuple("Event", ["time", "type", "body"])
+Property = collections.namedtuple("Property", ["key", "context", "value"])
+
+
+def pad_size(size):
+    "Return a size padded to the 64-bit alignment of atoms."
+
+    return (size + 7) & ~7
+
+
+def read_atom(buffer, offset=0):
+    "Return the atom at an offset in a buffer, with a view of its body."
+
+    size, atom_type = ATOM_HEADER.unpack_from(buffer, offset)
+    start = offset + ATOM_HEADER.size
+    end = start + size
+    if end > len(buffer):
+        raise ValueError(
+            f"atom at {offset} overruns buffer by {end - len(buffer)}"
+        )
+
+    return Atom(atom_type, memoryview(buffer)[start:end])
+
+
+def read_atoms(buffer):
+    "Yield every atom in a buffer of consecutive padded atoms."
+
+    view = memoryview(buffer)
+    offset = 0
+    while offset + ATOM_HEADER.size <= len(view):
+        atom = read_atom(view, offset)
+        yield atom
+        offset += ATOM_HEADER.size + pad_size(len(atom.body))
+
+    if offset < len(view):
+        raise ValueError(
+            f"{len(view) - offset} trailing bytes at {offset} are not an atom"
+        )
+
+
+def sequence_events(sequence, beats=False):
+    """Yield every event in the body of an atom:Sequence.
+
+    Event times are integer frames, or floating point beats if beats is true,
+    which depends on the unit of the sequence.
+    """
+
+    header = BEATS_EVENT_HEADER if beats else EVENT_HEADER
+    body = sequence.body
+    offset = BODY_HEADER.size
+    while offset < len(body):
+        time, size, event_type = header.unpack_from(body, offset)
+        start = offset + header.size
+        end = start + size
+        if end > len(body):
+            raise ValueError(f"event at {offset} overruns sequence")
+
+        yield Event(time, event_type, body[start:end])
+        offset = start + pad_size(size)
+
+
+def object_properties(obj):
+    "Yield every property in the body of an atom:Object."
+
+    body = obj.body
+    offset = BODY_HEADER.size
+    while offset < len(body):
+        key, context, size, value_type = PROPERTY_HEADER.unpack_from(
+            body, offset
+        )
+        start = offset + PROPERTY_HEADER.size
+        end = start + size
+        if end > len(body):
+            raise ValueError(f"property at {offset} overruns object")
+
+        yield Property(key, context, Atom(value_type, body[start:end]))
+        offset = start + pad_size(size)
+
+
+def object_header(obj):
+    "Return the (id, otype) of an atom:Object."
+
+    return BODY_HEADER.unpack_from(obj.body, 0)
+
+
+def tuple_elements(atom_tuple):
+    "Yield every element in an atom:Tuple."
+
+    return read_atoms(atom_tuple.body)
+
+
+def event_offsets(sequence):
+    "Return a list of the offsets of every event in a sequence body."
+
+    body = sequence.body
+    offsets = []
+    offset = BODY_HEADER.size
+    while offset < len(body):
+        offsets += [offset]
+        size = ATOM_HEADER.unpack_from(body, offset + 8)[0]
+        offset += EVENT_HEADER.size + pad_size(size)
+
+    if offset > pad_size(len(body)):
+        raise ValueError(f"event at {offsets[-1]} overruns sequence")
+
+    return offsets
+
+
+def event_dtype(beats=False):
+    "Return the NumPy dtype of an event header."
+
+    numpy = importlib.import_module("numpy")
+    time_type = "=f8" if beats else "=i8"
+    return numpy.dtype([("time", time_type), ("size", "=u4"), ("type", "=u4")])
+
+
+def event_table(sequence, beats=False):
+    """Return a NumPy structured array of the event headers in a sequence.
+
+    The array has the fields time, size, and type.  If every event has the
+    same size, as is common for MIDI, then the array is a strided view of the
+    sequence and nothing is copied.  Otherwise, the events are walked to find
+    their offsets, and the headers are gathered into a new array.
+    """
+
+    numpy = importlib.import_module("numpy")
+    dtype = event_dtype(beats)
+    body = sequence.body
+    n_bytes = len(body) - BODY_HEADER.size
+    if n_bytes <= 0:
+        return numpy.zeros(0, dtype)
+
+    # Try viewing the sequence as if every event is the size of the first
+    first_size = ATOM_HEADER.unpack_from(body, BODY_HEADER.size + 8)[0]
+    stride = EVENT_HEADER.size + pad_size(first_size)
+    if n_bytes % stride == 0:
+        table = numpy.ndarray(
+            (n_bytes // stride,),
+            dtype,
+            buffer=body,
+            offset=BODY_HEADER.size,
+            strides=(stride,),
+        )
+        if numpy.all(table["size"] == first_size):
+            return table
+
+    offsets = numpy.array(event_offsets(sequence), dtype=numpy.intp)
+    octets = numpy.frombuffer(body, numpy.uint8)
+    columns = numpy.arange(EVENT_HEADER.size, dtype=numpy.intp)
+    headers = octets[offsets[:, None] + columns]
+    return headers.view(dtype).reshape(-1)
+
+
+def encode_object(object_type, properties, object_id=0):
+    """Return the body of an atom:Object as bytes.
+
+    Properties are (key, Atom) pairs, and are written in order with their
+    values padded, like the forge writes them.
+    """
+
+    chunks = [BODY_HEADER.pack(object_id, object_type)]
+    for key, value in properties:
+        body = bytes(value.body)
+        chunks += [
+            PROPERTY_HEADER.pack(key, 0, len(body), value.type),
+            body,
+            bytes(pad_size(len(body)) - len(body)),
+        ]
+
+    return b"".join(chunks)
+
+
+def _octet_rows(numpy, bodies, n_rows):
+    "Return an array of event bodies as a 2-D array of octets."
+
+    octets = numpy.ascontiguousarray(bodies).view(numpy.uint8)
+    return octets.reshape(n_rows, octets.size // max(n_rows, 1))
+
+
+def _event_headers(numpy, times, types, sizes):
+    "Return event headers as a 2-D array of octets."
+
+    headers = numpy.zeros(len(times), event_dtype())
+    headers["time"] = times
+    headers["size"] = sizes
+    headers["type"] = types
+    return headers.view(numpy.uint8).reshape(len(times), EVENT_HEADER.size)
+
+
+def _encode_uniform(numpy, times, types, rows):
+    "Return the body octets of a sequence of events with equal sizes."
+
+    n_events, size = rows.shape
+    start = EVENT_HEADER.size
+    end = start + size
+    octets = numpy.zeros((n_events, start + pad_size(size)), numpy.uint8)
+    octets[:, :start] = _event_headers(numpy, times, types, size)
+    octets[:, start:end] = rows
+    return octets.reshape(-1)
+
+
+def _encode_scattered(numpy, times, types, rows, sizes):
+    "Return the body octets of a sequence of events with different sizes."
+
+    row_size = rows.shape[1]
+    start = EVENT_HEADER.size
+    sizes = numpy.asarray(sizes, dtype=numpy.intp)
+    if numpy.any((sizes < 0) | (sizes > row_size)):
+        raise ValueError("event size is outside its body row")
+
+    # Find the offset of every event, then scatter headers and bodies there
+    strides = start + ((sizes + 7) & ~7)
+    offsets = numpy.cumsum(strides) - strides
+    octets = numpy.zeros(strides.sum(), numpy.uint8)
+    columns = numpy.arange(start + row_size, dtype=numpy.intp)
+    positions = offsets[:, None] + columns
+    octets[positions[:, :start]] = _event_headers(numpy, times, types, sizes)
+
+    used = columns[:row_size] < sizes[:, None]
+    octets[positions[:, start:][used]] = rows[used]
+    return octets
+
+
+def encode_sequence(sequence_type, times, types, bodies, sizes=None):
+    """Return an atom:Sequence of events as a NumPy array of octets.
+
+    This writes exactly what the forge writes for the same events, with a
+    few array operations instead of several calls for every event.  Times
+    are in frames, and types are the body type of each event, or one type for
+    all of them.  Bodies is an array with a row for each event, like an
+    (n, 3) array of MIDI messages, or an array of n floats.  If sizes are
+    given, then only that many octets of each row are written.
+    """
+
+    numpy = importlib.import_module("numpy")
+    times = numpy.asarray(times, dtype="=i8")
+    rows = _octet_rows(numpy, bodies, len(times))
+    if sizes is None:
+        events = _encode_uniform(numpy, times, types, rows)
+    else:
+        events = _encode_scattered(numpy, times, types, rows, sizes)
+
+    start = SEQUENCE_HEADER.size
+    octets = numpy.empty(start + len(events), numpy.uint8)
+    SEQUENCE_HEADER.pack_into(
+        octets, 0, len(octets) - ATOM_HEADER.size, sequence_type, 0, 0
+    )
+    octets[start:] = events
+    return octets
+
+
+def _forge_cases(numpy, count):
+    "Return a list of (name, times, types, bodies, sizes) to test encoding."
+
+    rng = numpy.random.default_rng(0)
+    times = numpy.sort(rng.integers(0, 8192, count))
+    midi = rng.integers(0, 256, (count, 3), dtype=numpy.uint8)
+    floats = rng.standard_normal(count).astype("=f4")
+    rows = rng.integers(0, 256, (count, 24), dtype=numpy.uint8)
+    sizes = rng.integers(0, 25, count)
+    types = rng.integers(1, 64, count)
+
+    return [
+        ("empty", times[:0], 1, midi[:0], None),
+        ("midi", times, 19, midi, None),
+        ("float", times, 5, floats, None),
+        ("mixed", times, types, rows, sizes),
+    ]
+
+
+def _forge_sequence(program, times, types, rows, sizes):
+    "Return the octets of a sequence written by a forge program."
+
+    lines = [
+        f"{t} {y} {n} {rows[i, :n].tobytes().hex(' ')}\n"
+        for i, (t, y, n) in enumerate(zip(times, types, sizes))
+    ]
+
+    return subprocess.run(
+        [program],
+        input="".join(lines).encode("utf-8"),
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+
+
+def _table_matches(table, times, types, sizes):
+    "Return true if an event table has the given times, types, and sizes."
+
+    numpy = importlib.import_module("numpy")
+    return (
+        numpy.array_equal(table["time"], times)
+        and numpy.array_equal(table["type"], types)
+        and numpy.array_equal(table["size"], sizes)
+    )
+
+
+def check_forge(program, count):
+    "Check that encoded sequences match those written by a forge program."
+
+    numpy = importlib.import_module("numpy")
+    status = 0
+    for name, times, types, bodies, sizes in _forge_cases(numpy, count):
+        rows = _octet_rows(numpy, bodies, len(times))
+        all_types = numpy.broadcast_to(types, times.shape)
+        all_sizes = numpy.full(times.shape, rows.shape[1])
+        if sizes is not None:
+            all_sizes = sizes
+
+        forged = _forge_sequence(program, times, all_types, rows, all_sizes)
+        encoded = encode_sequence(
+            ATOM_HEADER.unpack_from(forged, 0)[1], times, types, bodies, sizes
+        )
+        if encoded.tobytes() != forged:
+            sys.stderr.write(f"error: {name}: Encoded sequence differs\n")
+            status = 1
+            continue
+
+        # Check that the encoded sequence reads back as the same events
+        table = event_table(read_atom(encoded))
+        if not _table_matches(table, times, all_types, all_sizes):
+            sys.stderr.write(f"error: {name}: Events read back differently\n")
+            status = 1
+
+    return status
+
+
+def _open_capture(path):
+    "Return a read-only memory map of a capture file, or empty bytes."
+
+    with open(path, "rb") as capture:
+        if capture.seek(0, 2) == 0:
+            return b""
+
+        return mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _describe(value, limit=16):
+    "Return a string of the hex octets of a buffer, truncated if long."
+
+    octets = bytes(value[:limit]).hex(" ")
+    return octets + (" ..." if len(value) > limit else "")
+
+
+def dump(path, beats=False):
+    "Print every event of every sequence in a capture file."
+
+    capture = _open_capture(path)
+    for number, sequence in enumerate(read_atoms(capture)):
+        unit, _ = BODY_HEADER.unpack_from(sequence.body, 0)
+        print(f"{number}: type {sequence.type} unit {unit}")
+        for event in sequence_events(sequence, beats):
+            body = _describe(event.body)
+            print(
+                f"  {event.time} type {event.type} [{len(event.body)}] {body}"
+            )
+
+    return 0
+
+
+def stats(path, beats=False):
+    "Print the number of events of each type in a capture file."
+
+    numpy = importlib.import_module("numpy")
+    capture = _open_capture(path)
+    n_sequences = 0
+    counts = {}
+    sizes = {}
+    for sequence in read_atoms(capture):
+        table = event_table(sequence, beats)
+        types, type_counts = numpy.unique(table["type"], return_counts=True)
+        for event_type, count in zip(types.tolist(), type_counts.tolist()):
+            counts[event_type] = counts.get(event_type, 0) + count
+            sizes[event_type] = sizes.get(event_type, 0) + int(
+                table["size"][table["type"] == event_type].sum()
+            )
+
+        n_sequences += 1
+
+    print(f"{n_sequences} sequences, {sum(counts.values())} events")
+    for event_type, count in sorted(counts.items()):
+        print(
+            f"  type {event_type}: {count} events, {sizes[event_type]} bytes"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... COMMAND FILE",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--beats",
+        action="store_true",
+        help="read event times as beats instead of frames",
+    )
+
+    commands = ap.add_subparsers(title="commands", dest="command")
+    commands.required = True
+
+    for capture_command, capture_help in [
+        ("dump", "print every event in a capture file"),
+        ("stats", "print statistics about events in a capture file"),
+    ]:
+        capture_parser = commands.add_parser(
+            capture_command, help=capture_help
+        )
+        capture_parser.add_argument("path", metavar="CAPTURE_FILE")
+
+    check_parser = commands.add_parser(
+        "check-forge", help="check encoding against a forge program"
+    )
+    check_parser.add_argument(
+        "--count",
+        type=int,
+        default=10000,
+        help="number of events in each test sequence (default: 10000)",
+    )
+    check_parser.add_argument("path", metavar="FORGE_PROGRAM")
+
+    args = ap.parse_args(sys.argv[1:])
+    try:
+        if args.command == "check-forge":
+            sys.exit(check_forge(args.path, args.count))
+
+        command = dump if args.command == "dump" else stats
+        sys.exit(command(args.path, args.beats))
+    except (OSError, ValueError, struct.error) as error:
+        sys.stderr.write(f"error: {args.path}: {error}\n")
+        sys.exit(1)
@@ -0,0 +1,907 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Measure the throughput of LV2 plugins with a minimal host.
+
+Plugin libraries are loaded into this process with ctypes, and ports are
+connected directly to NumPy arrays.  The host provides the urid:map, log:log,
+and worker:schedule features.  Scheduled work is done immediately, as when
+freewheeling, and responses are delivered after run(), so every run does the
+same thing.
+
+Inputs are generated from the plugin data.  Audio inputs get noise, control
+inputs get their default value, and event inputs get MIDI notes if they
+support MIDI.  Before measuring, a setup cycle sends the default state as
+patch:Set messages, and a time:Position that starts the transport, to ports
+that support them.
+
+For every block size, each plugin runs for about the same number of frames,
+and the fastest of several repeats is reported.  For example:
+
+  lv2_bench.py --plugin http://lv2plug.in/plugins/eg-amp build/plugins
+
+Times include calling run() from Python, which is also measured alone, so
+results for small blocks are mostly the cost of the host.
+"""
+
+import argparse
+import collections
+import ctypes
+import os
+import struct
+import sys
+import time
+
+import numpy
+import rdflib
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_SCRIPTS_DIR, "..", "lv2specgen"))
+
+import lv2bundles  # noqa: E402 pylint: disable=wrong-import-position
+
+import lv2_atom  # noqa: E402 pylint: disable=wrong-import-position
+
+atom = rdflib.Namespace("http://lv2plug.in/ns/ext/atom#")
+log = rdflib.Namespace("http://lv2plug.in/ns/ext/log#")
+lv2 = rdflib.Namespace("http://lv2plug.in/ns/lv2core#")
+midi = rdflib.Namespace("http://lv2plug.in/ns/ext/midi#")
+patch = rdflib.Namespace("http://lv2plug.in/ns/ext/patch#")
+rsz = rdflib.Namespace("http://lv2plug.in/ns/ext/resize-port#")
+state = rdflib.Namespace("http://lv2plug.in/ns/ext/state#")
+time_ns = rdflib.Namespace("http://lv2plug.in/ns/ext/time#")
+urid = rdflib.Namespace("http://lv2plug.in/ns/ext/urid#")
+worker = rdflib.Namespace("http://lv2plug.in/ns/ext/worker#")
+xsd = rdflib.Namespace("http://www.w3.org/2001/XMLSchema#")
+
+# Features the host provides, and features that are only flags
+SUPPORTED_FEATURES = {
+    str(urid.map),
+    str(log.log),
+    str(worker.schedule),
+    str(state.loadDefaultState),
+    str(lv2.hardRTCapable),
+    str(lv2.isLive),
+}
+
+# Minimum size of atom port buffers, which are rounded up to a power of two
+DEFAULT_ATOM_CAPACITY = 8192
+
+# Minimum number of cycles to run for any block size
+MIN_CYCLES = 16
+
+# Number of frames between MIDI events sent to plugins
+NOTE_PERIOD = 256
+
+# Literal datatypes, and the atom type and struct format of their value
+_LITERAL_ATOMS = {
+    str(xsd.boolean): (atom.Bool, "=i"),
+    str(xsd.double): (atom.Double, "=d"),
+    str(xsd.float): (atom.Float, "=f"),
+    str(xsd.int): (atom.Int, "=i"),
+    str(xsd.integer): (atom.Int, "=i"),
+    str(xsd.long): (atom.Long, "=q"),
+}
+
+
+def _struct(name, fields):
+    "Return a ctypes structure type."
+
+    return type(name, (ctypes.Structure,), {"_fields_": fields})
+
+
+_Handle = ctypes.c_void_p
+
+_MapFunc = ctypes.CFUNCTYPE(ctypes.c_uint32, _Handle, ctypes.c_char_p)
+_PrintfFunc = ctypes.CFUNCTYPE(
+    ctypes.c_int, _Handle, ctypes.c_uint32, ctypes.c_char_p
+)
+_VPrintfFunc = ctypes.CFUNCTYPE(
+    ctypes.c_int, _Handle, ctypes.c_uint32, ctypes.c_char_p, ctypes.c_void_p
+)
+_RespondFunc = ctypes.CFUNCTYPE(
+    ctypes.c_int, _Handle, ctypes.c_uint32, ctypes.c_void_p
+)
+_WorkFunc = ctypes.CFUNCTYPE(
+    ctypes.c_int,
+    _Handle,
+    _RespondFunc,
+    _Handle,
+    ctypes.c_uint32,
+    ctypes.c_void_p,
+)
+
+LV2Feature = _struct(
+    "LV2_Feature", [("URI", ctypes.c_char_p), ("data", ctypes.c_void_p)]
+)
+
+LV2Descriptor = _struct(
+    "LV2_Descriptor",
+    [
+        ("URI", ctypes.c_char_p),
+        (
+            "instantiate",
+            ctypes.CFUNCTYPE(
+                _Handle,
+                ctypes.c_void_p,
+                ctypes.c_double,
+                ctypes.c_char_p,
+                ctypes.c_void_p,
+            ),
+        ),
+        (
+            "connect_port",
+            ctypes.CFUNCTYPE(None, _Handle, ctypes.c_uint32, ctypes.c_void_p),
+        ),
+        ("activate", ctypes.CFUNCTYPE(None, _Handle)),
+        ("run", ctypes.CFUNCTYPE(None, _Handle, ctypes.c_uint32)),
+        ("deactivate", ctypes.CFUNCTYPE(None, _Handle)),
+        ("cleanup", ctypes.CFUNCTYPE(None, _Handle)),
+        ("extension_data", ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_char_p)),
+    ],
+)
+
+LV2URIDMap = _struct("LV2_URID_Map", [("handle", _Handle), ("map", _MapFunc)])
+
+LV2LogLog = _struct(
+    "LV2_Log_Log",
+    [("handle", _Handle), ("printf", _PrintfFunc), ("vprintf", _VPrintfFunc)],
+)
+
+LV2WorkerSchedule = _struct(
+    "LV2_Worker_Schedule",
+    [
+        ("handle", _Handle),
+        (
+            "schedule_work",
+            ctypes.CFUNCTYPE(
+                ctypes.c_int, _Handle, ctypes.c_uint32, ctypes.c_void_p
+            ),
+        ),
+    ],
+)
+
+LV2WorkerInterface = _struct(
+    "LV2_Worker_Interface",
+    [
+        ("work", _WorkFunc),
+        ("work_response", _RespondFunc),
+        ("end_run", ctypes.CFUNCTYPE(ctypes.c_int, _Handle)),
+    ],
+)
+
+Port = collections.namedtuple(
+    "Port", ["index", "symbol", "types", "default", "capacity", "supports"]
+)
+
+Plugin = collections.namedtuple(
+    "Plugin", ["uri", "bundle", "binary", "ports", "features", "state"]
+)
+
+
+def _port_description(model, node):
+    "Return the description of a port."
+
+    default = model.value(node, lv2.default)
+    capacity = max(
+        DEFAULT_ATOM_CAPACITY, int(model.value(node, rsz.minimumSize) or 0)
+    )
+    return Port(
+        int(model.value(node, lv2["index"])),
+        str(model.value(node, lv2.symbol)),
+        {str(t) for t in model.objects(node, lv2bundles.rdf.type)},
+        0.0 if default is None else float(default),
+        1 << (capacity - 1).bit_length(),
+        {str(s) for s in model.objects(node, atom.supports)},
+    )
+
+
+def describe_plugins(world, uris=None):
+    "Return the descriptions of plugins in a world, or only some of them."
+
+    plugins = []
+    for uri in world.plugins():
+        if uris and str(uri) not in uris:
+            continue
+
+        model = world.load(uri)
+        binary = model.value(uri, lv2.binary)
+        default_state = model.value(uri, state.state)
+        plugins += [
+            Plugin(
+                str(uri),
+                os.path.dirname(lv2bundles.file_path(binary)),
+                lv2bundles.file_path(binary),
+                sorted(
+                    _port_description(model, node)
+                    for node in model.objects(uri, lv2.port)
+                ),
+                {str(f) for f in model.objects(uri, lv2.requiredFeature)},
+                (
+                    sorted(model.predicate_objects(default_state))
+                    if default_state is not None
+                    else []
+                ),
+            )
+        ]
+
+    return plugins
+
+
+class Host:
+    """The features that a host provides to every plugin instance.
+
+    This is URID mapping and logging, which aren't specific to an instance.
+    """
+
+    def __init__(self):
+        self.uris = {}  # URI => URID
+        self._libc = ctypes.CDLL(None)
+        self._map = LV2URIDMap(None, _MapFunc(self._map_uri))
+        self._log = LV2LogLog(
+            None, _PrintfFunc(self._printf), _VPrintfFunc(self._vprintf)
+        )
+
+    def map(self, uri):
+        "Return the URID for a URI string."
+
+        return self.uris.setdefault(str(uri), len(self.uris) + 1)
+
+    def _map_uri(self, _handle, uri):
+        return self.map(uri.decode("utf-8"))
+
+    def _write_log(self, level, message):
+        prefixes = {
+            self.map(log.Error): "error: ",
+            self.map(log.Warning): "warning: ",
+            self.map(log.Trace): None,
+        }
+
+        prefix = prefixes.get(level, "note: ")
+        if prefix is not None:
+            sys.stderr.write(prefix + message.decode("utf-8", "replace"))
+
+        return len(message)
+
+    def _printf(self, _handle, level, fmt):
+        # Arguments can't be read portably, so just show the format
+        return self._write_log(level, fmt)
+
+    def _vprintf(self, _handle, level, fmt, args):
+        message = ctypes.create_string_buffer(1024)
+        self._libc.vsnprintf(
+            message, ctypes.c_size_t(len(message)), fmt, ctypes.c_void_p(args)
+        )
+        return self._write_log(level, message.value)
+
+    def features(self):
+        "Return a list of features as (URI, data pointer) pairs."
+
+        return [
+            (str(urid.map), ctypes.addressof(self._map)),
+            (str(log.log), ctypes.addressof(self._log)),
+            (str(state.loadDefaultState), None),
+        ]
+
+
+class Instance:  # pylint: disable=too-many-instance-attributes
+    """An instance of a plugin loaded into this process.
+
+    Scheduled work is done immediately, unless defer_work is true, in which
+    case it is done when do_work() is called, like a worker thread would do
+    it.  Responses are delivered when deliver_responses() is called after
+    run().
+    """
+
+    def __init__(self, host, plugin, rate, defer_work=False):
+        library = ctypes.CDLL(plugin.binary, mode=ctypes.RTLD_LOCAL)
+        self.host = host
+        self.descriptor = _find_descriptor(library, plugin.uri)
+        self.requests = [] if defer_work else None
+        self.responses = []
+        self.worker = None
+
+        schedule = LV2WorkerSchedule(
+            None,
+            LV2WorkerSchedule._fields_[1][1](self._schedule_work),
+        )
+        self._respond_func = _RespondFunc(self._respond)
+        pairs = host.features() + [
+            (str(worker.schedule), ctypes.addressof(schedule))
+        ]
+        features = [LV2Feature(u.encode("utf-8"), d) for u, d in pairs]
+        array = (ctypes.POINTER(LV2Feature) * (len(features) + 1))(
+            *[ctypes.pointer(f) for f in features]
+        )
+
+        # References that must live as long as the instance
+        self._keep = [schedule, features, array, library]
+
+        self.handle = self.descriptor.instantiate(
+            ctypes.addressof(self.descriptor),
+            rate,
+            os.path.join(plugin.bundle, "").encode("utf-8"),
+            ctypes.addressof(array),
+        )
+        if not self.handle:
+            raise RuntimeError(f"Failed to instantiate <{plugin.uri}>")
+
+        if self.descriptor.extension_data:
+            interface = self.descriptor.extension_data(
+                str(worker.interface).encode("utf-8")
+            )
+            if interface:
+                self.worker = ctypes.cast(
+                    interface, ctypes.POINTER(LV2WorkerInterface)
+                ).contents
+
+    def _schedule_work(self, _handle, size, data):
+        if self.worker is None:
+            return 1  # LV2_WORKER_ERR_UNKNOWN
+
+        if self.requests is not None:
+            self.requests += [ctypes.string_at(data, size)]
+            return 0
+
+        return self.worker.work(
+            self.handle, self._respond_func, None, size, data
+        )
+
+    def _respond(self, _handle, size, data):
+        self.responses += [ctypes.string_at(data, size)]
+        return 0
+
+    def connect(self, index, address):
+        "Connect a port to a buffer at an address."
+
+        self.descriptor.connect_port(self.handle, index, address)
+
+    def run(self, n_frames):
+        "Run the instance for a number of frames."
+
+        self.descriptor.run(self.handle, n_frames)
+
+    def do_work(self):
+        "Do any work that was deferred since the last call."
+
+        if not self.requests:
+            return
+
+        requests, self.requests = self.requests, []
+        for request in requests:
+            self.worker.work(
+                self.handle, self._respond_func, None, len(request), request
+            )
+
+    def deliver_responses(self):
+        "Deliver responses from work to the plugin, and end the run."
+
+        if self.worker is None:
+            return
+
+        responses, self.responses = self.responses, []
+        for response in responses:
+            self.worker.work_response(self.handle, len(response), response)
+
+        if self.worker.end_run:
+            self.worker.end_run(self.handle)
+
+    def close(self):
+        "Deactivate and destroy the instance."
+
+        if self.handle:
+            self.descriptor.cleanup(self.handle)
+            self.handle = None
+
+    def __enter__(self):
+        if self.descriptor.activate:
+            self.descriptor.activate(self.handle)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.descriptor.deactivate:
+            self.descriptor.deactivate(self.handle)
+
+        self.close()
+
+
+def _find_descriptor(library, uri):
+    "Return the descriptor of a plugin in a library."
+
+    get_descriptor = library.lv2_descriptor
+    get_descriptor.restype = ctypes.POINTER(LV2Descriptor)
+    get_descriptor.argtypes = [ctypes.c_uint32]
+
+    index = 0
+    while True:
+        descriptor = get_descriptor(index)
+        if not descriptor:
+            raise RuntimeError(f"No descriptor for <{uri}>")
+
+        if descriptor.contents.URI.decode("utf-8") == uri:
+            return descriptor.contents
+
+        index += 1
+
+
+def _state_atom(host, value):
+    "Return a value in a default state as an atom."
+
+    if isinstance(value, rdflib.URIRef):
+        if value.startswith("file:"):
+            path = lv2bundles.file_path(value).encode("utf-8")
+            return lv2_atom.Atom(host.map(atom.Path), path + b"\0")
+
+        return lv2_atom.Atom(
+            host.map(atom.URID), struct.pack("=I", host.map(value))
+        )
+
+    datatype = str(value.datatype) if value.datatype else None
+    if datatype in _LITERAL_ATOMS:
+        atom_type, body_format = _LITERAL_ATOMS[datatype]
+        return lv2_atom.Atom(
+            host.map(atom_type), struct.pack(body_format, value.toPython())
+        )
+
+    return lv2_atom.Atom(
+        host.map(atom.String), str(value).encode("utf-8") + b"\0"
+    )
+
+
+def _float_atom(host, value):
+    "Return an atom:Float."
+
+    return lv2_atom.Atom(host.map(atom.Float), struct.pack("=f", value))
+
+
+def setup_messages(host, plugin, port):
+    "Return the bodies of messages to send to a port before running."
+
+    messages = []
+    if str(patch.Message) in port.supports:
+        for key, value in plugin.state:
+            messages += [
+                lv2_atom.encode_object(
+                    host.map(patch.Set),
+                    [
+                        (
+                            host.map(patch.property),
+                            lv2_atom.Atom(
+                                host.map(atom.URID),
+                                struct.pack("=I", host.map(key)),
+                            ),
+                        ),
+                        (host.map(patch.value), _state_atom(host, value)),
+                    ],
+                )
+            ]
+
+    if str(time_ns.Position) in port.supports:
+        messages += [
+            lv2_atom.encode_object(
+                host.map(time_ns.Position),
+                [
+                    (host.map(time_ns.barBeat), _float_atom(host, 0.0)),
+                    (host.map(time_ns.beatsPerMinute), _float_atom(host, 120)),
+                    (host.map(time_ns.speed), _float_atom(host, 1.0)),
+                ],
+            )
+        ]
+
+    return messages
+
+
+def note_events(n_frames, period):
+    "Return the times and bodies of alternating MIDI note on and off events."
+
+    times = numpy.arange(0, n_frames, period)
+    notes = 60 + (numpy.arange(len(times)) // 2) % 12
+    bodies = numpy.zeros((len(times), 3), numpy.uint8)
+    bodies[:, 0] = numpy.where(numpy.arange(len(times)) % 2, 0x80, 0x90)
+    bodies[:, 1] = notes
+    bodies[:, 2] = numpy.where(numpy.arange(len(times)) % 2, 0, 100)
+    return times, bodies
+
+
+class Schedule:
+    """Sequences to connect to an event input port, one for every cycle.
+
+    Cycles without events share a single empty sequence, so only cycles with
+    events take any memory.
+    """
+
+    def __init__(self, host, block_size, n_cycles):
+        self.sequence_type = host.map(atom.Sequence)
+        self.empty = lv2_atom.encode_sequence(
+            self.sequence_type, [], 0, numpy.zeros((0, 0), numpy.uint8)
+        )
+        self.sequences = [self.empty] * n_cycles
+        self.block_size = block_size
+        self._events = []  # (times, types, rows, sizes) for every addition
+
+    def add_events(self, times, event_type, rows, sizes=None):
+        """Add events from an array of times and a row of octets for each.
+
+        If sizes are given, then only that many octets of each row are the
+        body.  Events are merged with any that were added before, in order
+        of time.
+        """
+
+        if sizes is None:
+            sizes = numpy.full(len(rows), rows.shape[1])
+
+        self._events += [
+            (times, numpy.full(len(times), event_type), rows, sizes)
+        ]
+
+        times, types, rows, sizes = zip(*self._events)
+        width = max(r.shape[1] for r in rows)
+        rows = numpy.concatenate(
+            [numpy.pad(r, ((0, 0), (0, width - r.shape[1]))) for r in rows]
+        )
+
+        times = numpy.concatenate(times)
+        order = numpy.argsort(times, kind="stable")
+        self._encode(
+            times[order],
+            numpy.concatenate(types)[order],
+            rows[order],
+            numpy.concatenate(sizes)[order],
+        )
+
+    def _encode(self, times, types, rows, sizes):
+        "Encode the sequence for every cycle from sorted events."
+
+        bounds = numpy.searchsorted(
+            times // self.block_size, numpy.arange(len(self.sequences) + 1)
+        )
+        for cycle in numpy.flatnonzero(numpy.diff(bounds)):
+            begin, end = bounds[cycle], bounds[cycle + 1]
+            self.sequences[cycle] = lv2_atom.encode_sequence(
+                self.sequence_type,
+                times[begin:end] - cycle * self.block_size,
+                types[begin:end],
+                rows[begin:end],
+                sizes[begin:end],
+            )
+
+    def addresses(self):
+        "Return the address of the sequence for every cycle."
+
+        return [s.ctypes.data for s in self.sequences]
+
+
+def message_rows(messages):
+    "Return (rows, sizes) for the octets of messages, like for add_events()."
+
+    rows = numpy.zeros((len(messages), max(map(len, messages))), numpy.uint8)
+    for row, message in enumerate(messages):
+        rows[row, : len(message)] = numpy.frombuffer(message, numpy.uint8)
+
+    return rows, numpy.array([len(m) for m in messages])
+
+
+def _setup_sequence(host, plugin, port):
+    "Return a sequence of setup messages for a port at time zero."
+
+    messages = setup_messages(host, plugin, port)
+    if not messages:
+        return None
+
+    rows, sizes = message_rows(messages)
+    return lv2_atom.encode_sequence(
+        host.map(atom.Sequence),
+        numpy.zeros(len(messages), numpy.int64),
+        host.map(atom.Object),
+        rows,
+        sizes,
+    )
+
+
+class Runner:
+    """An activated instance with every port connected to a NumPy array.
+
+    Event inputs are connected to the sequence for each cycle before every
+    run, and event outputs are reset to their full capacity.
+    """
+
+    def __init__(self, instance, plugin, block_size, n_cycles):
+        host = instance.host
+        rng = numpy.random.default_rng(0)
+        self.instance = instance
+        self.block_size = block_size
+        self.arrays = []  # Buffers connected to the instance
+        self.inputs = []  # (port, schedule) for every event input
+        self.outputs = []  # (header, reset) for every event output
+
+        for port in plugin.ports:
+            is_input = str(lv2.InputPort) in port.types
+            if str(atom.AtomPort) in port.types and is_input:
+                schedule = Schedule(host, block_size, n_cycles)
+                if str(midi.MidiEvent) in port.supports:
+                    times, rows = note_events(
+                        n_cycles * block_size, NOTE_PERIOD
+                    )
+                    schedule.add_events(times, host.map(midi.MidiEvent), rows)
+
+                self.inputs += [(port, schedule)]
+                continue
+
+            if str(atom.AtomPort) in port.types:
+                array = numpy.zeros(8 + port.capacity, numpy.uint8)
+                reset = numpy.array(
+                    [port.capacity, host.map(atom.Chunk)], numpy.uint32
+                )
+                self.outputs += [(array[:8].view(numpy.uint32), reset)]
+            elif str(lv2.ControlPort) in port.types:
+                array = numpy.full(1, port.default, numpy.float32)
+            elif is_input:
+                array = rng.uniform(-0.5, 0.5, block_size).astype("=f4")
+            else:
+                array = numpy.zeros(block_size, numpy.float32)
+
+            self.arrays += [array]
+            instance.connect(port.index, array.ctypes.data)
+
+    def setup(self, plugin):
+        "Run a single cycle that sends setup messages to every event input."
+
+        host = self.instance.host
+        for port, schedule in self.inputs:
+            sequence = _setup_sequence(host, plugin, port)
+            if sequence is None:
+                sequence = schedule.empty
+
+            self.arrays += [sequence]
+            self.instance.connect(port.index, sequence.ctypes.data)
+
+        for header, reset in self.outputs:
+            header[:] = reset
+
+        self.instance.run(self.block_size)
+        self.instance.deliver_responses()
+        self.instance.do_work()
+
+    def _input_addresses(self, n_cycles, empty):
+        "Return (index, addresses) for every event input, one per cycle."
+
+        if empty:
+            return [
+                (port.index, [schedule.empty.ctypes.data] * n_cycles)
+                for port, schedule in self.inputs
+            ]
+
+        return [
+            (port.index, schedule.addresses())
+            for port, schedule in self.inputs
+        ]
+
+    def run(self, n_cycles, empty=False):
+        """Run for a number of cycles, and return the elapsed time in ns.
+
+        If empty is true, then run() is called with no frames or events, to
+        measure the cost of calling it.
+        """
+
+        handle = self.instance.handle
+        connect = self.instance.descriptor.connect_port
+        run = self.instance.descriptor.run
+        block_size = 0 if empty else self.block_size
+        inputs = self._input_addresses(n_cycles, empty)
+        deliver = None
+        if self.instance.worker is not None:
+            deliver = self.instance.deliver_responses
+
+        start = time.perf_counter_ns()
+        for cycle in range(n_cycles):
+            for index, addresses in inputs:
+                connect(handle, index, addresses[cycle])
+
+            for header, reset in self.outputs:
+                header[:] = reset
+
+            run(handle, block_size)
+            if deliver:
+                deliver()
+
+        return time.perf_counter_ns() - start
+
+    def time_cycles(self, n_cycles):
+        """Run for a number of cycles, and return the time of each in ns.
+
+        The time of a cycle is for run() and delivering responses, which a
+        host does in the audio thread.  Deferred work is done afterwards, and
+        isn't included.
+        """
+
+        instance = self.instance
+        handle = instance.handle
+        run = instance.descriptor.run
+        clock = time.perf_counter_ns
+        inputs = self._input_addresses(n_cycles, False)
+        times = numpy.zeros(n_cycles, numpy.int64)
+        for cycle in range(n_cycles):
+            for index, addresses in inputs:
+                instance.connect(index, addresses[cycle])
+
+            for header, reset in self.outputs:
+                header[:] = reset
+
+            start = clock()
+            run(handle, self.block_size)
+            instance.deliver_responses()
+            times[cycle] = clock() - start
+
+            instance.do_work()
+
+        return times
+
+
+def benchmark(host, plugin, block_size, options):
+    """Run a plugin with a block size and return (frames, overhead, time).
+
+    The overhead is the time of a run() with no frames, and the time is the
+    fastest of several repeats of every cycle, both in nanoseconds.
+    """
+
+    n_cycles = max(options.frames // block_size, MIN_CYCLES)
+    with Instance(host, plugin, options.rate) as instance:
+        runner = Runner(instance, plugin, block_size, n_cycles)
+        runner.setup(plugin)
+        runner.run(n_cycles)  # Warm up
+
+        overhead = min(
+            runner.run(n_cycles, True) for _ in range(options.repeats)
+        )
+        elapsed = min(runner.run(n_cycles) for _ in range(options.repeats))
+
+    return n_cycles * block_size, overhead / n_cycles, elapsed
+
+
+def parse_block_sizes(text):
+    "Return a list of block sizes from a comma-separated string."
+
+    return [int(size) for size in text.split(",")]
+
+
+def find_plugins(paths, uris):
+    """Return (plugins, status) for the plugins in paths that can be run.
+
+    An error is reported, and the status is non-zero, if there are no
+    plugins or if any require a feature that isn't supported.
+    """
+
+    bundles = lv2bundles.find_bundles(paths or lv2bundles.lv2_path())
+    plugins = describe_plugins(lv2bundles.World(bundles), uris)
+    if not plugins:
+        sys.stderr.write("error: No plugins found\n")
+        return [], 1
+
+    supported = []
+    for plugin in plugins:
+        missing = sorted(plugin.features - SUPPORTED_FEATURES)
+        if missing:
+            sys.stderr.write(
+                f"error: <{plugin.uri}> requires <{missing[0]}>\n"
+            )
+        else:
+            supported += [plugin]
+
+    return supported, int(len(supported) < len(plugins))
+
+
+def argument_parser(description, block_sizes):
+    """Return a parser for the arguments that choose plugins and sizes.
+
+    Scripts that use this host add their own options to the parser.
+    """
+
+    sizes = ",".join(str(size) for size in block_sizes)
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... [PATH]...",
+        description=description,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--block-sizes",
+        type=parse_block_sizes,
+        default=block_sizes,
+        metavar="SIZES",
+        help=f"comma-separated block sizes (default: {sizes})",
+    )
+    parser.add_argument(
+        "--plugin",
+        action="append",
+        metavar="URI",
+        help="plugin to measure (default: all)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=48000.0,
+        help="sample rate (default: 48000)",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        metavar="PATH",
+        help="bundle or directory to search for plugins (default: LV2_PATH)",
+    )
+
+    return parser
+
+
+def print_results(plugin, header, measure_row, block_sizes):
+    """Measure a plugin with every block size and print a table of results.
+
+    The function measure_row is called with each block size, and returns a
+    row of the table.  Nothing is printed if the plugin can't be loaded,
+    only an error, and false is returned.
+    """
+
+    try:
+        rows = [measure_row(block_size) for block_size in block_sizes]
+    except (OSError, RuntimeError) as error:
+        sys.stderr.write(f"error: {plugin.uri}: {error}\n")
+        return False
+
+    print(f"{plugin.uri}")
+    print(header)
+    print("\n".join(rows) + "\n")
+    return True
+
+
+def run_benchmarks(options):
+    """Run every benchmark and print the results.
+
+    A plugin that can't be loaded is reported, and the others still run.
+    """
+
+    plugins, status = find_plugins(options.paths, options.plugin)
+    host = Host()
+    header = (
+        f"  {'block':>5} {'frames':>8} {'samples/s':>10}"
+        f" {'ns/frame':>10} {'ns/run':>10} {'empty':>8}"
+    )
+
+    for plugin in plugins:
+
+        def measure_row(block_size, plugin=plugin):
+            n_frames, overhead, elapsed = benchmark(
+                host, plugin, block_size, options
+            )
+            n_cycles = n_frames // block_size
+            return (
+                f"  {block_size:5} {n_frames:8}"
+                f" {n_frames / elapsed * 1e9:10.4g}"
+                f" {elapsed / n_frames:10.2f}"
+                f" {elapsed / n_cycles:10.1f} {overhead:8.1f}"
+            )
+
+        if not print_results(plugin, header, measure_row, options.block_sizes):
+            status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    ap = argument_parser(__doc__, [2**n for n in range(14)])
+    ap.add_argument(
+        "--frames",
+        type=int,
+        default=65536,
+        help="number of frames to run for each size (default: 65536)",
+    )
+    ap.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="number of times to repeat each run (default: 3)",
+    )
+
+    sys.exit(run_benchmarks(ap.parse_args(sys.argv[1:])))
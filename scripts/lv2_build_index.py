@@ -5,8 +5,12 @@
 
 """
 Write an HTML index for a set of LV2 specifications.
+
+Specifications are described by the JSON sidecar files that lv2specgen writes
+where possible, so only bundles without an up to date sidecar are parsed.
 """
 
+import io
 import json
 import os
 import sys
@@ -15,6 +19,11 @@ import subprocess
 
 import rdflib
 
+# The bundle discovery module is shared with lv2specgen
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_SCRIPTS_DIR, "..", "lv2specgen"))
+
+import lv2bundles  # noqa: E402 pylint: disable=wrong-import-position
 
 doap = rdflib.Namespace("http://usefulinc.com/ns/doap#")
 lv2 = rdflib.Namespace("http://lv2plug.in/ns/lv2core#")
@@ -33,21 +42,6 @@ def _subst_file(template_path, output_file, substitutions):
             output_file.write(line)
 
 
-def _load_ttl(data_paths, exclude=None):
-    "Load an RDF model from a Turtle file."
-
-    model = rdflib.ConjunctiveGraph()
-    for path in data_paths:
-        if exclude is None or path not in exclude:
-            try:
-                model.parse(path, format="n3")
-            except SyntaxError as error:
-                sys.stderr.write(f"error: Failed to parse {path}\n")
-                raise error
-
-    return model
-
-
 def _warn(message):
     "Load a warning message."
 
@@ -86,49 +80,32 @@ def _spec_link_columns(spec, root, name, online):
     return col
 
 
-def _spec_description_column(model, spec):
-    "Return the description column in a spec row as an HTML string."
-
-    shortdesc = model.value(spec, doap.shortdesc, None, any=False)
-
-    return "<td>" + str(shortdesc) + "</td>" if shortdesc else "<td></td>"
-
-
-def index_row(model, spec, root_uri, online):
+def index_row(metadata, root_uri, online):
     "Return the row for a spec as an HTML string."
 
-    # Get version
-    minor = 0
-    micro = 0
-    try:
-        minor = int(model.value(spec, lv2.minorVersion, None, any=False))
-        micro = int(model.value(spec, lv2.microVersion, None, any=False))
-    except rdflib.exceptions.UniquenessError:
-        _warn(f"{spec} has no unique valid version")
-        return ""
+    minor = metadata["minorVersion"]
+    micro = metadata["microVersion"]
 
     row = "<tr>"
 
     # Specification and API
     row += _spec_link_columns(
-        spec,
+        metadata["uri"],
         root_uri,
-        model.value(spec, doap.name, None).replace("LV2 ", ""),
+        metadata["name"].replace("LV2 ", ""),
         online,
     )
 
     # Description
-    row += _spec_description_column(model, spec)
+    row += "<td>" + metadata["shortdesc"] + "</td>"
 
     # Version
     row += f"<td>{minor}.{micro}</td>"
 
     # Status
-    deprecated = model.value(spec, owl.deprecated, None)
-    deprecated = deprecated and str(deprecated) not in ["0", "false"]
     if minor == 0:
         row += '<td><span class="error">Experimental</span></td>'
-    elif deprecated:
+    elif metadata["deprecated"]:
         row += '<td><span class="warning">Deprecated</span></td>'
     elif micro % 2 == 0:
         row += '<td><span class="success">Stable</span></td>'
@@ -140,30 +117,67 @@ def index_row(model, spec, root_uri, online):
     return row
 
 
-def build_index(
-    lv2_source_root,
-    lv2_version,
-    input_paths,
-    root_uri,
-    online,
-):
-    "Build the LV2 specification index and write it to stdout."
+def load_sidecars(paths):
+    """Return the metadata in sidecar files written by lv2specgen.
 
-    model = _load_ttl(input_paths)
+    Sidecars that are out of date with the data files they were written from
+    are ignored, so those specifications are parsed instead.
+    """
+
+    sidecars = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as sidecar_file:
+                sidecar = json.load(sidecar_file)
+
+            digests = lv2bundles.file_digests(sidecar["files"])
+            if digests == sidecar["files"] and "bundle" in sidecar:
+                sidecars += [sidecar]
+        except (OSError, KeyError, ValueError):
+            pass
+
+    return sidecars
+
+
+def index_rows(world, sidecars, root_uri, online):
+    "Return the rows for all specifications in sidecars or a world."
 
     rows = []
-    for spec in model.triples([None, rdf.type, lv2.Specification]):
-        rows += [index_row(model, spec[0], root_uri, online)]
+    documented = set()
+    for sidecar in sidecars:
+        rows += [index_row(sidecar, root_uri, online)]
+        documented.add(sidecar["uri"])
+
+    for spec in world.specifications():
+        if str(spec) in documented:
+            continue
+
+        try:
+            model = world.load(spec)
+            metadata = lv2bundles.specification_metadata(model, spec)
+            rows += [index_row(metadata, root_uri, online)]
+        except rdflib.exceptions.UniquenessError:
+            _warn(f"{spec} has no unique valid version")
+            rows += [""]
+
+    return rows
+
 
+def build_index(lv2_source_root, lv2_version, rows):
+    "Build the LV2 specification index and return it as a string."
+
+    index = io.StringIO()
     _subst_file(
         os.path.join(lv2_source_root, "doc", "index.html.in"),
-        sys.stdout,
+        index,
         {
             "@ROWS@": "\n".join(sorted(rows)),
             "@LV2_VERSION@": lv2_version,
         },
     )
 
+    return index.getvalue()
+
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(
@@ -179,13 +193,34 @@ if __name__ == "__main__":
         default="http://lv2plug.in/ns/",
         help="root URI for specifications",
     )
+    ap.add_argument(
+        "-o",
+        "--output",
+        help="output file, only written if changed (default: stdout)",
+    )
     ap.add_argument(
         "--online",
         action="store_true",
         default=False,
         help="build online documentation",
     )
-    ap.add_argument("input_paths", nargs="+", help="path to Turtle input file")
+    ap.add_argument(
+        "--vocabulary",
+        action="append",
+        default=[],
+        metavar="BUNDLE",
+        help="bundle to load once as a shared base, like schemas.lv2",
+    )
+    ap.add_argument(
+        "--vocabulary-cache",
+        metavar="FILE",
+        help="file to cache the parsed vocabulary bundles in",
+    )
+    ap.add_argument(
+        "input_paths",
+        nargs="+",
+        help="path to bundle, Turtle file in a bundle, or lv2specgen sidecar",
+    )
 
     args = ap.parse_args(sys.argv[1:])
 
@@ -204,4 +239,33 @@ if __name__ == "__main__":
                 os.path.dirname(meson_build_path)
             )
 
-    build_index(**vars(args))
+    base = None
+    if args.vocabulary:
+        base = lv2bundles.load_vocabulary(
+            args.vocabulary, args.vocabulary_cache
+        )
+
+    # Bundles that have an up to date sidecar don't need to be parsed at all
+    json_paths = [p for p in args.input_paths if p.endswith(".json")]
+    data_paths = [p for p in args.input_paths if not p.endswith(".json")]
+    spec_sidecars = load_sidecars(json_paths)
+    documented_bundles = {sidecar["bundle"] for sidecar in spec_sidecars}
+
+    # Only the manifests are parsed until a specification is loaded
+    bundles = lv2bundles.find_bundles(data_paths)
+    spec_world = lv2bundles.World(
+        [b for b in bundles if b not in documented_bundles], base=base
+    )
+
+    index_html = build_index(
+        args.lv2_source_root,
+        args.lv2_version,
+        index_rows(spec_world, spec_sidecars, args.root_uri, args.online),
+    )
+
+    if args.output is None:
+        sys.stdout.write(index_html)
+    elif lv2bundles.write_if_changed(args.output, index_html):
+        print(f"Wrote {args.output}")
+    else:
+        print(f"Skipped unchanged {args.output}")
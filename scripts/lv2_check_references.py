@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Check that references between LV2 specifications are all defined.
+
+All bundles are loaded into a single model, so a term in one specification
+that refers to a missing term in another is reported, which is not possible
+when checking each bundle separately.
+"""
+
+import argparse
+import sys
+
+import lv2_snapshot
+
+_LV2 = "http://lv2plug.in/ns/lv2core#"
+_OWL = "http://www.w3.org/2002/07/owl#"
+_RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+
+_ONTOLOGY_TYPES = [f"<{_LV2}Specification>", f"<{_OWL}Ontology>"]
+
+
+def _is_uri(term):
+    "Return true if an N-Triples term string is a URI."
+
+    return term.startswith("<")
+
+
+def _uri(term):
+    "Return the URI of an N-Triples URI term, or the term itself."
+
+    return term[1:-1] if _is_uri(term) else term
+
+
+def _namespace(uri):
+    "Return the namespace prefix URI for an ontology URI."
+
+    return uri if uri[-1] in "#/" else uri + "#"
+
+
+def _term_namespace(uri, namespaces):
+    "Return the namespace that uri is a term in, or None."
+
+    for end in ["#", "/"]:
+        namespace = uri.rsplit(end, 1)[0] + end
+        if end in uri and namespace in namespaces:
+            return namespace
+
+    return None
+
+
+def undefined_references(triples):
+    """Return a sorted list of (term, referrer) pairs for undefined terms.
+
+    The triples are tuples of N-Triples term strings, as returned by
+    lv2_snapshot.model_triples() or a Snapshot.
+    """
+
+    triples = list(triples)
+    defined = {s for s, p, _ in triples if p == _RDF_TYPE}
+
+    ontologies = set()
+    for s, p, o in triples:
+        if p == _RDF_TYPE and o in _ONTOLOGY_TYPES and _is_uri(s):
+            ontologies.add(s)
+
+    namespaces = {_namespace(_uri(o)) for o in ontologies}
+    ontologies |= {f"<{ns}>" for ns in namespaces}
+
+    undefined = set()
+    for triple in triples:
+        for node in triple:
+            if (
+                _is_uri(node)
+                and node not in defined
+                and node not in ontologies
+                and _term_namespace(_uri(node), namespaces) is not None
+            ):
+                undefined.add((_uri(node), _uri(triple[0])))
+
+    return sorted(undefined)
+
+
+def run(paths, snapshot_path=None):
+    "Check every bundle in or at paths, returning non-zero on errors."
+
+    if snapshot_path is not None:
+        triples = lv2_snapshot.Snapshot(snapshot_path).triples()
+    else:
+        bundles = lv2_snapshot.bundle_paths(paths)
+        triples = lv2_snapshot.model_triples(lv2_snapshot.load_corpus(bundles))
+
+    status = 0
+    for term, referrer in undefined_references(triples):
+        sys.stderr.write(f"error: {referrer} refers to undefined <{term}>\n")
+        status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... PATH...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--snapshot",
+        help="check a compiled snapshot instead of parsing bundles",
+    )
+    ap.add_argument(
+        "PATH", nargs="*", help="bundle or directory containing bundles"
+    )
+
+    args = ap.parse_args(sys.argv[1:])
+    if not args.PATH and args.snapshot is None:
+        ap.error("either a snapshot or at least one PATH is required")
+
+    sys.exit(run(args.PATH, args.snapshot))
@@ -6,17 +6,19 @@
 """
 Check that a Turtle file has valid syntax and strict formatting.
 
-This is a strict tool that enforces machine formatting with serdi.
+This is a strict tool that enforces machine formatting with serdi, or with an
+equivalent built-in formatter that does not need to run serdi for every file.
 """
 
 import argparse
+import concurrent.futures
 import difflib
-import filecmp
 import sys
-import tempfile
 import os
 import subprocess
 
+import lv2_format_turtle
+
 
 def _show_diff(from_lines, to_lines, from_path, to_path):
     "Show a diff between two files, returning non-zero if they differ."
@@ -34,39 +36,61 @@ def _show_diff(from_lines, to_lines, from_path, to_path):
     return int(differences)
 
 
-def _check_file_equals(patha, pathb):
-    "Check that two files are equal, returning non-zero if they differ."
+def _check_output(path, output):
+    "Check that a file has the given content, returning non-zero if not."
+
+    if not os.access(path, os.F_OK):
+        sys.stderr.write(f"error: missing file {path}")
+        return 1
+
+    with open(path, "rb") as in_file:
+        if in_file.read() == output:
+            return 0
+
+    with open(path, "r", encoding="utf-8") as in_file:
+        return _show_diff(
+            in_file.readlines(),
+            output.decode("utf-8").splitlines(True),
+            path,
+            path + " (formatted)",
+        )
+
+
+def _format(serdi, path):
+    "Run serdi to format a file and return the output as bytes."
+
+    command = [serdi, "-o", "turtle", path]
+    return subprocess.run(command, capture_output=True, check=True).stdout
 
-    for path in (patha, pathb):
-        if not os.access(path, os.F_OK):
-            sys.stderr.write(f"error: missing file {path}")
-            return 1
 
-    if filecmp.cmp(patha, pathb, shallow=False):
-        return 0
+def _format_files(serdi, rel_paths, jobs, backend):
+    "Return an iterator over the formatted output of every file."
 
-    with open(patha, "r", encoding="utf-8") as in_a:
-        with open(pathb, "r", encoding="utf-8") as in_b:
-            return _show_diff(in_a.readlines(), in_b.readlines(), patha, pathb)
+    if backend == "python":
+        for rel_path in rel_paths:
+            try:
+                yield lv2_format_turtle.format_file(rel_path)
+            except lv2_format_turtle.TurtleError as error:
+                sys.stderr.write(f"error: {error}\n")
+                yield None
 
+        return
 
-def run(serdi, filenames):
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        yield from executor.map(lambda p: _format(serdi, p), rel_paths)
+
+
+def run(serdi, filenames, jobs=None, backend="serdi"):
     "Check that every file in filenames has valid formatted syntax."
 
     status = 0
+    rel_paths = [os.path.relpath(filename) for filename in filenames]
+    outputs = _format_files(serdi, rel_paths, jobs, backend)
 
-    for filename in filenames:
-        rel_path = os.path.relpath(filename)
-        with tempfile.NamedTemporaryFile(mode="w", delete=False) as out:
-            out_name = out.name
-            command = [serdi, "-o", "turtle", rel_path]
-            subprocess.check_call(command, stdout=out)
-
-        if _check_file_equals(rel_path, out_name):
+    for rel_path, output in zip(rel_paths, outputs):
+        if output is None or _check_output(rel_path, output):
             status = 1
 
-        os.remove(out_name)
-
     return status
 
 
@@ -77,9 +101,22 @@ if __name__ == "__main__":
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
 
+    ap.add_argument(
+        "--backend",
+        choices=["serdi", "python"],
+        default="serdi",
+        help="formatter to compare against",
+    )
     ap.add_argument("--serdi", default="serdi", help="path to serdi")
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="number of files to check in parallel",
+    )
     ap.add_argument("TURTLE_FILE", nargs="+", help="input file to check")
 
     args = ap.parse_args(sys.argv[1:])
 
-    sys.exit(run(args.serdi, args.TURTLE_FILE))
+    sys.exit(run(args.serdi, args.TURTLE_FILE, args.jobs, args.backend))
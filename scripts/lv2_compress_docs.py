@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Prepare generated documentation for static hosting.
+
+Stylesheets are copied to names that include a hash of their contents, and
+references to them in HTML pages and other stylesheets are rewritten, so they
+can be cached forever.  Compressed variants of every HTML and CSS file are
+then written next to them, so the server never needs to compress anything
+itself.
+"""
+
+import argparse
+import gzip
+import hashlib
+import importlib
+import os
+import posixpath
+import re
+import sys
+
+# Files are written with the helpers shared with lv2specgen
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_SCRIPTS_DIR, "..", "lv2specgen"))
+
+import lv2bundles  # noqa: E402 pylint: disable=wrong-import-position
+
+# Stylesheets to fingerprint, in order, so each can import those before it
+FINGERPRINTED_NAMES = ["pygments.css", "style.css"]
+COMPRESSED_EXTENSIONS = [".css", ".html"]
+COMPRESSED_SUFFIXES = [".br", ".gz"]
+
+_REFERENCE = re.compile(r'((?:href|src)=")([^"#?]*)')
+_FINGERPRINT = re.compile(r"\.[0-9a-f]{10}(?=\.[^.]*$)")
+_CSS_REFERENCE = re.compile(
+    r"""((?:@import\s+(?:url\()?|url\()\s*["']?)([^"')#?\s]*)"""
+)
+
+
+def _brotli():
+    "Return the brotli module, or None if it is not installed."
+
+    try:
+        return importlib.import_module("brotli")
+    except ImportError:
+        return None
+
+
+def _files(root):
+    "Return a sorted list of all files under root."
+
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        paths += [os.path.join(dirpath, f) for f in filenames]
+
+    return sorted(paths)
+
+
+def _read(path):
+    "Return the contents of a file as bytes."
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _remove(path):
+    "Remove a file if it exists, and return true if it was removed."
+
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def fingerprint_name(filename, content):
+    "Return a file name that includes a hash of its content."
+
+    stem, extension = os.path.splitext(filename)
+    digest = hashlib.sha256(content).hexdigest()[0:10]
+    return f"{stem}.{digest}{extension}"
+
+
+def remove_stale_fingerprints(path, current):
+    "Remove old fingerprinted copies of a file, and their compressed variants."
+
+    stem, extension = os.path.splitext(os.path.basename(path))
+    pattern = re.compile(
+        re.escape(stem)
+        + r"\.[0-9a-f]{10}"
+        + re.escape(extension)
+        + "(?:"
+        + "|".join(re.escape(s) for s in COMPRESSED_SUFFIXES)
+        + ")?$"
+    )
+
+    directory = os.path.dirname(path)
+    current_names = [current] + [current + s for s in COMPRESSED_SUFFIXES]
+    for filename in sorted(os.listdir(directory)):
+        if pattern.match(filename) and filename not in current_names:
+            _remove(os.path.join(directory, filename))
+
+
+def _rewrite(text, pattern, directory, renames):
+    "Return text with references to renamed files matched by pattern changed."
+
+    def _replace(match):
+        url = match.group(2)
+        if not url or "://" in url or url.startswith("/"):
+            return match.group(0)
+
+        # Files may refer to a fingerprint from a previous run
+        target = os.path.normpath(os.path.join(directory, url))
+        target = os.path.join(
+            os.path.dirname(target),
+            _FINGERPRINT.sub("", os.path.basename(target)),
+        )
+        if target not in renames:
+            return match.group(0)
+
+        new_name = os.path.basename(renames[target])
+        new_url = posixpath.join(posixpath.dirname(url), new_name)
+        return match.group(1) + new_url
+
+    return pattern.sub(_replace, text)
+
+
+def fingerprint_styles(root):
+    """Copy stylesheets to fingerprinted names and return a path mapping.
+
+    References in each stylesheet to those already fingerprinted are
+    rewritten before it is hashed, so its name changes when they do.
+    """
+
+    renames = {}
+    paths = _files(root)
+    for name in FINGERPRINTED_NAMES:
+        for path in [p for p in paths if os.path.basename(p) == name]:
+            directory = os.path.dirname(path)
+            with open(path, "r", encoding="utf-8") as style:
+                text = _rewrite(
+                    style.read(), _CSS_REFERENCE, directory, renames
+                )
+
+            content = text.encode("utf-8")
+            new_path = os.path.join(directory, fingerprint_name(name, content))
+
+            lv2bundles.write_if_changed(new_path, content)
+            remove_stale_fingerprints(path, os.path.basename(new_path))
+            renames[os.path.normpath(path)] = new_path
+
+    return renames
+
+
+def rewrite_references(html_path, renames):
+    "Rewrite links to renamed files in an HTML page."
+
+    with open(html_path, "r", encoding="utf-8") as html:
+        text = html.read()
+
+    directory = os.path.dirname(html_path)
+    text = _rewrite(text, _REFERENCE, directory, renames)
+    lv2bundles.write_if_changed(html_path, text)
+
+
+def compress(path, brotli=None):
+    "Write compressed variants of a file and return how many were written."
+
+    content = _read(path)
+
+    # Zero the timestamp so the output only depends on the input
+    gzipped = gzip.compress(content, 9, mtime=0)
+    n_written = int(lv2bundles.write_if_changed(path + ".gz", gzipped))
+
+    if brotli is not None:
+        compressed = brotli.compress(content)
+        n_written += int(lv2bundles.write_if_changed(path + ".br", compressed))
+    else:
+        # An old variant would be out of date, but still served
+        _remove(path + ".br")
+
+    return n_written
+
+
+def run(roots, fingerprint=True):
+    "Fingerprint and compress the documentation under roots."
+
+    brotli = _brotli()
+    if brotli is None:
+        sys.stderr.write(
+            "warning: Python brotli module not found, only writing .gz files"
+            " (the server will fall back to gzip for clients that accept br)\n"
+        )
+
+    for root in roots:
+        if fingerprint:
+            renames = fingerprint_styles(root)
+            for path in _files(root):
+                if path.endswith(".html"):
+                    rewrite_references(path, renames)
+
+        n_written = 0
+        n_total = 0
+        for path in _files(root):
+            if os.path.splitext(path)[1] in COMPRESSED_EXTENSIONS:
+                n_written += compress(path, brotli)
+                n_total += 1 if brotli is None else 2
+
+        print(
+            f"{root}: {n_written} compressed files written,"
+            f" {n_total - n_written} unchanged"
+        )
+
+    return 0
+
+
+def _install_path(path):
+    "Return path in the installation directory when run by meson install."
+
+    prefix = os.environ.get("MESON_INSTALL_DESTDIR_PREFIX")
+    return os.path.join(prefix, path) if prefix else path
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... DIRECTORY...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--no-fingerprint",
+        action="store_true",
+        help="only compress, leave stylesheet names unchanged",
+    )
+    ap.add_argument(
+        "directories",
+        nargs="+",
+        metavar="DIRECTORY",
+        help="documentation output directory (relative to the install prefix"
+        + " when run by meson install)",
+    )
+
+    args = ap.parse_args(sys.argv[1:])
+
+    sys.exit(
+        run(
+            [_install_path(d) for d in args.directories],
+            not args.no_fingerprint,
+        )
+    )
@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Format Turtle files in the same canonical style as serdi.
+
+This writes exactly what `serdi -o turtle` does for the constructs used in
+LV2 bundles, without needing to run an external program for every file.
+Comments are dropped, statements are written in the order they were read,
+and repeated subjects and predicates are abbreviated.
+"""
+
+import argparse
+import collections
+import re
+import subprocess
+import sys
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+_PN_CHARS_BASE = (
+    "A-Za-z\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u02ff\u0370-\u037d"
+    "\u037f-\u1fff\u200c-\u200d\u2070-\u218f\u2c00-\u2fef"
+    "\u3001-\ud7ff\uf900-\ufdcf\ufdf0-\ufffd\U00010000-\U000effff"
+)
+_PN_CHARS = _PN_CHARS_BASE + "_0-9\u00b7\u0300-\u036f\u203f-\u2040-"
+_PN_PREFIX = f"[{_PN_CHARS_BASE}](?:[{_PN_CHARS}.]*[{_PN_CHARS}])?"
+_PLX = r"%[0-9A-Fa-f]{2}|\\[-_~.!$&'()*+,;=/?#@%]"
+_PN_LOCAL = (
+    f"(?:[{_PN_CHARS_BASE}_:0-9]|{_PLX})"
+    f"(?:(?:[{_PN_CHARS}.:]|{_PLX})*(?:[{_PN_CHARS}:]|{_PLX}))?"
+)
+
+_TOKEN = re.compile(
+    "|".join(
+        [
+            r"(?P<space>(?:\s|#[^\n]*)+)",
+            r"(?P<iri><[^<>\"{}|^`\x00-\x20]*>)",
+            r'(?P<long_string>"""(?:[^"\\]|\\.|"(?!""))*"""'
+            + r"|'''(?:[^'\\]|\\.|'(?!''))*''')",
+            r'(?P<string>"(?:[^"\\\n\r]|\\.)*"' + r"|'(?:[^'\\\n\r]|\\.)*')",
+            f"(?P<blank>_:[{_PN_CHARS}](?:[{_PN_CHARS}.]*[{_PN_CHARS}])?)",
+            r"(?P<directive>@prefix|@base)\b",
+            r"(?P<lang>@[a-zA-Z]+(?:-[a-zA-Z0-9]+)*)",
+            r"(?P<double>[+-]?(?:[0-9]+\.[0-9]*|\.[0-9]+|[0-9]+)"
+            + r"[eE][+-]?[0-9]+)",
+            r"(?P<decimal>[+-]?[0-9]*\.[0-9]+)",
+            r"(?P<integer>[+-]?[0-9]+)",
+            f"(?P<pname>(?:{_PN_PREFIX})?:(?:{_PN_LOCAL})?)",
+            r"(?P<keyword>[A-Za-z]+)",
+            r"(?P<punct>\^\^|[][(),;.])",
+        ]
+    )
+)
+
+_ESCAPES = {
+    "t": "\t",
+    "b": "\b",
+    "n": "\n",
+    "r": "\r",
+    "f": "\f",
+    '"': '"',
+    "'": "'",
+    "\\": "\\",
+}
+
+_NAME = re.compile(f"{_PN_LOCAL}$")
+
+
+class TurtleError(Exception):
+    "An error while reading Turtle syntax."
+
+
+# An anonymous blank node with a (possibly empty) description
+_Anon = collections.namedtuple("_Anon", ["description"])
+
+# A collection (RDF list) of objects
+_Collection = collections.namedtuple("_Collection", ["items"])
+
+# A quoted literal with its long string flag and language or datatype suffix
+_Literal = collections.namedtuple("_Literal", ["value", "is_long", "suffix"])
+
+
+def _unescape(text):
+    "Return a string literal body with escapes replaced."
+
+    def replace(match):
+        escape = match.group(0)
+        if escape[1] in "uU":
+            return chr(int(escape[2:], 16))
+
+        return _ESCAPES[escape[1]]
+
+    return re.sub(r"\\(?:u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)", replace, text)
+
+
+def _escape_char(char):
+    "Return an escape sequence for a control character."
+
+    return f"\\u{ord(char):04X}"
+
+
+def _escape_string(value):
+    "Return a short string literal body."
+
+    out = []
+    for char in value:
+        if char == "\\":
+            out += ["\\\\"]
+        elif char == '"':
+            out += ['\\"']
+        elif char == "\n":
+            out += ["\\n"]
+        elif char == "\r":
+            out += ["\\r"]
+        elif char == "\t":
+            out += ["\\t"]
+        elif char == "\b":
+            out += ["\\b"]
+        elif char == "\f":
+            out += ["\\f"]
+        elif ord(char) < 0x20 or char == "\x7f":
+            out += [_escape_char(char)]
+        else:
+            out += [char]
+
+    return "".join(out)
+
+
+def _escape_long_string(value):
+    "Return a long string literal body."
+
+    out = []
+    quotes = 0
+    for index, char in enumerate(value):
+        quotes = quotes + 1 if char == '"' else 0
+        if char == "\\":
+            out += ["\\\\"]
+        elif char == "\b":
+            out += ["\\b"]
+        elif char in "\n\r\t\f":
+            out += [char]
+        elif char == '"' and (quotes >= 3 or index == len(value) - 1):
+            out += ['\\"']
+        elif ord(char) < 0x20 or char == "\x7f":
+            out += [_escape_char(char)]
+        else:
+            out += [char]
+
+    return "".join(out)
+
+
+def _format_literal(literal):
+    "Return the text for a literal."
+
+    value = literal.value
+    if literal.is_long:
+        return '"""' + _escape_long_string(value) + '"""' + literal.suffix
+
+    return '"' + _escape_string(value) + '"' + literal.suffix
+
+
+class _Parser:
+    "A Turtle parser that produces a tree of formatted terms."
+
+    def __init__(self, text, path):
+        self.tokens = []
+        self.index = 0
+        self.path = path
+        self.prefixes = {}
+
+        offset = 0
+        while offset < len(text):
+            match = _TOKEN.match(text, offset)
+            if not match:
+                line = text.count("\n", 0, offset) + 1
+                raise TurtleError(f"{path}:{line}: invalid syntax")
+
+            if match.lastgroup != "space":
+                self.tokens += [(match.lastgroup, match.group(0), offset)]
+
+            offset = match.end()
+
+        self.text = text
+
+    def _error(self, message):
+        "Raise an error at the current token."
+
+        offset = (
+            self.tokens[self.index][2]
+            if self.index < len(self.tokens)
+            else len(self.text)
+        )
+        line = self.text.count("\n", 0, offset) + 1
+        raise TurtleError(f"{self.path}:{line}: {message}")
+
+    def _peek(self):
+        "Return the current token, or (None, None) at the end."
+
+        if self.index < len(self.tokens):
+            return self.tokens[self.index][0:2]
+
+        return (None, None)
+
+    def _next(self):
+        "Consume and return the current token."
+
+        token = self._peek()
+        if token[0] is None:
+            self._error("unexpected end of input")
+
+        self.index += 1
+        return token
+
+    def _expect(self, text):
+        "Consume a token with the given text or raise an error."
+
+        if self._next()[1] != text:
+            self.index -= 1
+            self._error(f"expected `{text}'")
+
+    def qualify(self, uri):
+        "Return a prefixed name for uri if possible, or None."
+
+        for name, prefix in self.prefixes.items():
+            if uri.startswith(prefix):
+                suffix = uri.replace(prefix, "", 1)
+                if _NAME.match(suffix):
+                    return name + ":" + suffix
+
+        return None
+
+    def _iri(self, token, is_predicate=False):
+        "Return the text for an IRI token."
+
+        uri = _unescape(token[1:-1])
+        if is_predicate and uri == RDF_TYPE:
+            return "a"
+
+        qualified = self.qualify(uri) if ":" in uri else None
+        return qualified if qualified else "<" + uri + ">"
+
+    def _datatype(self):
+        "Read a datatype IRI or prefixed name and return its text."
+
+        kind, text = self._next()
+        if kind == "iri":
+            return self._iri(text), _unescape(text[1:-1])
+
+        if kind == "pname":
+            return text, None
+
+        self.index -= 1
+        return self._error("expected datatype")
+
+    def _literal(self, kind, text):
+        "Read the rest of a literal starting with a string token."
+
+        is_long = kind == "long_string"
+        body = text[3:-3] if is_long else text[1:-1]
+        value = _unescape(body)
+
+        suffix = ""
+        datatype = None
+        if self._peek()[0] == "lang":
+            suffix = self._next()[1]
+        elif self._peek()[1] == "^^":
+            self._next()
+            suffix, datatype = self._datatype()
+            suffix = "^^" + suffix
+
+        if datatype in [XSD + "boolean", XSD + "integer"]:
+            return value
+
+        if (
+            datatype == XSD + "decimal"
+            and "." in value
+            and not value.endswith(".")
+        ):
+            return value
+
+        has_newline = "\n" in value or "\r" in value
+        raw = re.sub(r"\\.", "", body)
+        has_quote = '"' in raw or "'" in raw
+        return _Literal(value, has_newline or has_quote, suffix)
+
+    def _object(self):
+        "Read an object and return its text or tree."
+
+        kind, text = self._next()
+        if kind in ("string", "long_string"):
+            return self._literal(kind, text)
+
+        if kind == "double":
+            datatype = self.qualify(XSD + "double")
+            return _Literal(text, False, "^^" + (datatype or f"<{XSD}double>"))
+
+        if kind in ("integer", "decimal") or text in ["true", "false"]:
+            return text
+
+        if text == "[":
+            description = []
+            if self._peek()[1] != "]":
+                description = self._predicate_object_list()
+            self._expect("]")
+            return _Anon(description)
+
+        if text == "(":
+            items = []
+            while self._peek()[1] != ")":
+                items += [self._object()]
+            self._next()
+            return _Collection(items)
+
+        self.index -= 1
+        return self._subject()
+
+    def _subject(self):
+        "Read a subject IRI, prefixed name, or blank node label."
+
+        kind, text = self._next()
+        if kind == "iri":
+            return self._iri(text)
+
+        if kind in ("pname", "blank"):
+            return text
+
+        self.index -= 1
+        return self._error("expected subject")
+
+    def _predicate(self):
+        "Read a predicate and return its text."
+
+        kind, text = self._next()
+        if kind == "keyword" and text == "a":
+            return "a"
+
+        if kind == "iri":
+            return self._iri(text, True)
+
+        if kind == "pname":
+            return text
+
+        self.index -= 1
+        return self._error("expected predicate")
+
+    def _predicate_object_list(self):
+        "Read a list of (predicate, objects) pairs."
+
+        description = []
+        while True:
+            predicate = self._predicate()
+            objects = [self._object()]
+            while self._peek()[1] == ",":
+                self._next()
+                objects += [self._object()]
+
+            description += [(predicate, objects)]
+
+            while self._peek()[1] == ";":
+                self._next()
+
+            if self._peek()[1] in [".", "]", None]:
+                return description
+
+    def _directive(self, keyword, sparql):
+        "Read a prefix or base directive and return its text."
+
+        if keyword.lower() in ["@prefix", "prefix"]:
+            kind, name = self._next()
+            if kind != "pname" or not name.endswith(":"):
+                self.index -= 1
+                self._error("expected prefix name")
+
+            kind, uri = self._next()
+            if kind != "iri":
+                self.index -= 1
+                self._error("expected IRI")
+
+            if not sparql:
+                self._expect(".")
+
+            self.prefixes[name[0:-1]] = _unescape(uri[1:-1])
+            return f"@prefix {name} {uri} .\n"
+
+        kind, uri = self._next()
+        if kind != "iri":
+            self.index -= 1
+            self._error("expected IRI")
+
+        if not sparql:
+            self._expect(".")
+
+        return f"@base {uri} .\n"
+
+    def statements(self):
+        "Parse the document and return a list of directives and triples."
+
+        statements = []
+        while self._peek()[0] is not None:
+            kind, text = self._peek()
+            if kind == "directive":
+                self._next()
+                statements += [self._directive(text, False)]
+                continue
+
+            if kind == "keyword" and text.lower() in ["prefix", "base"]:
+                self._next()
+                statements += [self._directive(text, True)]
+                continue
+
+            if text in ["[", "("]:
+                subject = self._object()
+                description = []
+                if self._peek()[1] != ".":
+                    description = self._predicate_object_list()
+            else:
+                subject = self._subject()
+                description = self._predicate_object_list()
+
+            self._expect(".")
+            statements += [(subject, description)]
+
+        return statements
+
+
+def _merge_description(description):
+    "Merge consecutive objects of the same predicate."
+
+    merged = []
+    for predicate, objects in description:
+        if merged and merged[-1][0] == predicate:
+            merged[-1] = (predicate, merged[-1][1] + objects)
+        else:
+            merged += [(predicate, list(objects))]
+
+    return merged
+
+
+def _merge_statements(statements):
+    "Merge consecutive statements about the same named subject."
+
+    merged = []
+    for statement in statements:
+        if (
+            isinstance(statement, tuple)
+            and merged
+            and isinstance(merged[-1], tuple)
+            and isinstance(statement[0], str)
+            and merged[-1][0] == statement[0]
+        ):
+            merged[-1] = (statement[0], merged[-1][1] + statement[1])
+        else:
+            merged += [statement]
+
+    return merged
+
+
+def _is_nested(node):
+    "Return true if node is written on several lines."
+
+    return isinstance(node, (_Anon, _Collection))
+
+
+def _write_node(out, node, indent):
+    "Write a node which starts at the given indentation level."
+
+    if isinstance(node, str):
+        out += [node]
+    elif isinstance(node, _Literal):
+        out += [_format_literal(node)]
+    elif isinstance(node, _Anon):
+        if not node.description:
+            out += ["[]"]
+        else:
+            out += ["["]
+            _write_description(out, node.description, indent + 1)
+            out += ["\n" + "\t" * indent + "]"]
+    elif isinstance(node, _Collection):
+        out += ["("]
+        for item in node.items:
+            out += ["\n" + "\t" * (indent + 1)]
+            _write_node(out, item, indent + 1)
+        out += ["\n" + "\t" * indent + ")"]
+
+
+def _write_description(out, description, indent):
+    "Write a predicate object list, each predicate on a new line."
+
+    first_predicate = True
+    for predicate, objects in _merge_description(description):
+        if not first_predicate:
+            out += [" ;"]
+
+        out += ["\n" + "\t" * indent, predicate, " "]
+        first_predicate = False
+
+        previous = None
+        for obj in objects:
+            if previous is not None:
+                if _is_nested(previous):
+                    out += [" , "]
+                elif isinstance(obj, _Anon) and obj.description:
+                    out += [" ,\n" + "\t" * indent]
+                else:
+                    out += [" ,\n" + "\t" * (indent + 1)]
+
+            _write_node(out, obj, indent)
+            previous = obj
+
+
+def format_turtle(text, path="<input>"):
+    "Return the canonical form of a Turtle document as a string."
+
+    out = []
+    in_statement = False
+    for statement in _merge_statements(_Parser(text, path).statements()):
+        if isinstance(statement, str):
+            if in_statement:
+                out += [" .\n\n"]
+                in_statement = False
+
+            out += [statement]
+            continue
+
+        if in_statement:
+            out += [" .\n\n"]
+        elif out:
+            out += ["\n"]
+
+        subject, description = statement
+        _write_node(out, subject, 0)
+        _write_description(out, description, 1)
+        in_statement = True
+
+    if in_statement:
+        out += [" .\n"]
+
+    return "".join(out)
+
+
+def format_file(path):
+    "Return the canonical form of a Turtle file as bytes."
+
+    with open(path, "r", encoding="utf-8") as in_file:
+        return format_turtle(in_file.read(), path).encode("utf-8")
+
+
+def _compare_with_serdi(serdi, paths):
+    "Check that the output for every path matches serdi's."
+
+    status = 0
+    for path in paths:
+        command = [serdi, "-o", "turtle", path]
+        expected = subprocess.run(command, capture_output=True, check=True)
+        if format_file(path) != expected.stdout:
+            sys.stderr.write(f"error: Output for {path} differs from serdi\n")
+            status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... INPUT...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--serdi",
+        help="check that the output matches serdi at this path",
+    )
+    ap.add_argument("INPUT", nargs="+", help="input Turtle file")
+
+    args = ap.parse_args(sys.argv[1:])
+
+    try:
+        if args.serdi:
+            sys.exit(_compare_with_serdi(args.serdi, args.INPUT))
+
+        for turtle_path in args.INPUT:
+            sys.stdout.buffer.write(format_file(turtle_path))
+    except TurtleError as error:
+        sys.stderr.write(f"error: {error}\n")
+        sys.exit(1)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Measure the latency of every run() of LV2 plugins.
+
+This uses the host in lv2_bench.py, but rather than the total time of many
+cycles, it times each call of run() and collects the times in a histogram for
+every plugin and block size.  The median and high percentiles show how much
+longer than usual a cycle can take, which is what causes dropouts in a live
+host, even when the average is fast.
+
+To reduce noise, this process is pinned to a single CPU, garbage collection
+is disabled while timing, and every instance runs for some cycles before
+timing starts.  Scheduled work is done between cycles, like a worker thread
+would do it, so only delivering the responses is timed.
+
+Every few cycles, the setup messages are sent again to ports that support
+them: the default state as patch:Set messages, which makes eg-sampler load
+its sample again, and a time:Position, which moves eg-metro back to the
+start of a bar.  The median time of these cycles is shown separately, so
+they can be told apart from other slow cycles.  For example:
+
+  lv2_latency.py --cpu 1 --plugin http://lv2plug.in/plugins/eg-metro build
+
+Times are in microseconds, and include calling run() from Python.
+"""
+
+import gc
+import math
+import os
+import sys
+
+import numpy
+import rdflib
+
+import lv2_bench
+
+atom = rdflib.Namespace("http://lv2plug.in/ns/ext/atom#")
+
+# Percentiles shown for each histogram
+PERCENTILES = [50.0, 99.0, 99.9]
+
+
+class Histogram:
+    """A histogram of non-negative integers with log-linear buckets.
+
+    Like HdrHistogram, values below 2**precision have a bucket each, and
+    every higher power of two is split into 2**(precision - 1) buckets, so
+    values are recorded with a relative error below 2**(1 - precision).
+    """
+
+    def __init__(self, precision=8):
+        self.precision = precision
+        self.counts = numpy.zeros((65 - precision) << (precision - 1), int)
+        self.max = 0
+
+    def record(self, values):
+        "Record an array of values."
+
+        if len(values) == 0:
+            return
+
+        values = numpy.asarray(values, numpy.int64)
+        shifts = numpy.maximum(numpy.frexp(values)[1] - self.precision, 0)
+        buckets = (shifts << (self.precision - 1)) + (values >> shifts)
+        self.counts += numpy.bincount(buckets, minlength=len(self.counts))
+        self.max = max(self.max, int(values.max()))
+
+    def _highest_value(self, bucket):
+        "Return the highest value that is recorded in a bucket."
+
+        shift = max((bucket >> (self.precision - 1)) - 1, 0)
+        lowest = (bucket - (shift << (self.precision - 1))) << shift
+        return lowest + (1 << shift) - 1
+
+    def value_at_percentile(self, percentile):
+        "Return the value that a percentage of recorded values are at most."
+
+        rank = max(math.ceil(percentile / 100.0 * self.counts.sum()), 1)
+        bucket = numpy.searchsorted(numpy.cumsum(self.counts), rank)
+        return min(self._highest_value(int(bucket)), self.max)
+
+
+def pin_cpu(cpu):
+    "Pin this process to a CPU, or to the last allowed one if cpu is None."
+
+    if not hasattr(os, "sched_setaffinity"):
+        sys.stderr.write("warning: Unable to pin process to a CPU\n")
+        return None
+
+    if cpu is None:
+        cpu = max(os.sched_getaffinity(0))
+
+    os.sched_setaffinity(0, {cpu})
+    return cpu
+
+
+def add_messages(host, plugin, runner, period):
+    "Send setup messages every period cycles and return those cycles."
+
+    cycles = []
+    for port, schedule in runner.inputs:
+        messages = lv2_bench.setup_messages(host, plugin, port)
+        if messages:
+            rows, sizes = lv2_bench.message_rows(messages)
+            n_cycles = len(schedule.sequences)
+            cycles = numpy.arange(period - 1, n_cycles, period)
+            schedule.add_events(
+                numpy.repeat(cycles * runner.block_size, len(messages)),
+                host.map(atom.Object),
+                numpy.tile(rows, (len(cycles), 1)),
+                numpy.tile(sizes, len(cycles)),
+            )
+
+    return cycles
+
+
+def measure(host, plugin, block_size, options):
+    "Run a plugin with a block size and return (histogram, message times)."
+
+    histogram = Histogram()
+    with lv2_bench.Instance(host, plugin, options.rate, True) as instance:
+        runner = lv2_bench.Runner(instance, plugin, block_size, options.cycles)
+        message_cycles = add_messages(
+            host, plugin, runner, options.event_period
+        )
+
+        runner.setup(plugin)
+        runner.time_cycles(min(options.warmup, options.cycles))
+
+        gc.collect()
+        gc.disable()
+        try:
+            times = runner.time_cycles(options.cycles)
+        finally:
+            gc.enable()
+
+    histogram.record(times)
+    return histogram, times[message_cycles]
+
+
+def run_measurements(options):
+    """Measure every plugin and print the results.
+
+    A plugin that can't be loaded is reported, and the others still run.
+    """
+
+    plugins, status = lv2_bench.find_plugins(options.paths, options.plugin)
+    cpu = pin_cpu(options.cpu)
+    if cpu is not None:
+        print(f"Pinned to CPU {cpu}\n")
+
+    host = lv2_bench.Host()
+    header = (
+        f"  {'block':>5} {'cycles':>7}"
+        + "".join(f" {f'p{p:g}':>8}" for p in PERCENTILES)
+        + f" {'max':>8} {'message':>8}"
+    )
+
+    for plugin in plugins:
+
+        def measure_row(block_size, plugin=plugin):
+            histogram, message_times = measure(
+                host, plugin, block_size, options
+            )
+            values = [histogram.value_at_percentile(p) for p in PERCENTILES]
+            values += [histogram.max]
+            message = "-"
+            if len(message_times):
+                message = f"{numpy.median(message_times) / 1000.0:.2f}"
+
+            return (
+                f"  {block_size:5} {options.cycles:7}"
+                + "".join(f" {v / 1000.0:8.2f}" for v in values)
+                + f" {message:>8}"
+            )
+
+        if not lv2_bench.print_results(
+            plugin, header, measure_row, options.block_sizes
+        ):
+            status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    ap = lv2_bench.argument_parser(__doc__, [64, 256, 1024])
+    ap.add_argument(
+        "--cpu",
+        type=int,
+        help="CPU to run on (default: last available)",
+    )
+    ap.add_argument(
+        "--cycles",
+        type=int,
+        default=20000,
+        help="number of cycles to time for each size (default: 20000)",
+    )
+    ap.add_argument(
+        "--event-period",
+        type=int,
+        default=500,
+        metavar="CYCLES",
+        help="cycles between setup messages (default: 500)",
+    )
+    ap.add_argument(
+        "--warmup",
+        type=int,
+        default=1000,
+        metavar="CYCLES",
+        help="cycles to run before timing (default: 1000)",
+    )
+
+    sys.exit(run_measurements(ap.parse_args(sys.argv[1:])))
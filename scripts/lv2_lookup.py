@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Look up terms in LV2 specifications through a local server.
+
+The server loads a set of bundles once and keeps lookup tables for them in
+memory, so answering a query takes far less time than starting a client.
+Before each query, bundles that have changed on disk are loaded again, and
+only those.  For example:
+
+  lv2_lookup.py serve lv2 schemas.lv2 &
+  lv2_lookup.py term atom:frameTime
+  lv2_lookup.py domain lv2:Port
+  lv2_lookup.py subclasses lv2:Port
+  lv2_lookup.py search sample rate
+
+Terms can be written as prefixed names, with the prefixes used in the data,
+or as full URIs.
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import re
+import signal
+import socket
+import socketserver
+import sys
+import time
+
+_RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+_RDFS = "http://www.w3.org/2000/01/rdf-schema#"
+
+# Properties of terms that are shown, and the names they are shown with
+PROPERTIES = {
+    _RDF + "type": "type",
+    _RDFS + "label": "label",
+    _RDFS + "subClassOf": "subClassOf",
+    _RDFS + "subPropertyOf": "subPropertyOf",
+    _RDFS + "domain": "domain",
+    _RDFS + "range": "range",
+    _RDFS + "comment": "comment",
+}
+
+# Properties whose values are indexed as words for searching
+TEXT_PROPERTIES = ["label", "comment"]
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def default_socket_path():
+    "Return the default path of the server socket for this user."
+
+    directory = os.environ.get("XDG_RUNTIME_DIR")
+    if directory:
+        return os.path.join(directory, "lv2_lookup.sock")
+
+    return os.path.join("/tmp", f"lv2_lookup-{os.getuid()}.sock")
+
+
+def _words(text):
+    "Return the set of lowercase words in a string."
+
+    return set(_WORD.findall(text.lower()))
+
+
+def _local_name(uri):
+    "Return the part of a URI after the last hash or slash."
+
+    return re.split("[#/]", uri)[-1]
+
+
+class Index:
+    """Lookup tables for the terms described in a set of models.
+
+    Everything is stored as plain strings, so queries don't touch rdflib.
+    """
+
+    def __init__(self, models, prefixes):
+        self.prefixes = {p: str(n) for p, n in sorted(prefixes.items())}
+        self.terms = {}  # URI => {property name => sorted values}
+        self.inverse = {}  # (property name, object URI) => subject URIs
+        self.words = {}  # Word => URIs of terms it appears in
+
+        for model in models:
+            for s, p, o in model:
+                name = PROPERTIES.get(str(p))
+                if name is None or o.n3().startswith("_:"):
+                    continue
+
+                description = self.terms.setdefault(str(s), {})
+                description.setdefault(name, set()).add(str(o))
+                if name not in TEXT_PROPERTIES:
+                    key = (name, str(o))
+                    self.inverse.setdefault(key, set()).add(str(s))
+
+        for uri, description in self.terms.items():
+            words = _words(_local_name(uri))
+            for name in TEXT_PROPERTIES:
+                for text in description.get(name, []):
+                    words |= _words(text)
+
+            for word in words:
+                self.words.setdefault(word, set()).add(uri)
+
+            for name, values in description.items():
+                description[name] = sorted(values)
+
+    def expand(self, name):
+        "Return the URI for a prefixed name or URI, or raise KeyError."
+
+        if name.startswith("<") and name.endswith(">"):
+            return name[1:-1]
+
+        if "://" in name:
+            return name
+
+        prefix, _, local = name.partition(":")
+        if prefix not in self.prefixes:
+            raise KeyError(f"unknown prefix '{prefix}:'")
+
+        return self.prefixes[prefix] + local
+
+    def compact(self, uri):
+        "Return the shortest prefixed name for a URI, or the URI itself."
+
+        best = f"<{uri}>"
+        for prefix, namespace in self.prefixes.items():
+            if uri.startswith(namespace) and prefix:
+                name = f"{prefix}:{uri[len(namespace):]}"
+                if len(name) < len(best):
+                    best = name
+
+        return best
+
+    def describe(self, name):
+        "Return lines that describe a term."
+
+        uri = self.expand(name)
+        if uri not in self.terms:
+            raise KeyError(f"no description of {name}")
+
+        lines = [self.compact(uri)]
+        for prop_name in PROPERTIES.values():
+            for value in self.terms[uri].get(prop_name, []):
+                if prop_name not in TEXT_PROPERTIES:
+                    value = self.compact(value)
+                elif prop_name == "comment":
+                    value = value.split("\n\n")[0].replace("\n", " ")
+
+                lines += [f"  {prop_name}: {value}"]
+
+        return lines
+
+    def subjects(self, prop_name, name):
+        "Return compact names of terms with a property value, sorted."
+
+        uris = self.inverse.get((prop_name, self.expand(name)), set())
+        return sorted(self.compact(uri) for uri in uris)
+
+    def closure(self, name, prop_name, inverse=False):
+        """Return all terms reachable from a term through a property.
+
+        For example, the closure of rdfs:subClassOf is the superclasses of a
+        class, and its inverse closure is the subclasses.
+        """
+
+        start = self.expand(name)
+        seen = {start}
+        pending = [start]
+        while pending:
+            uri = pending.pop()
+            if inverse:
+                related = self.inverse.get((prop_name, uri), set())
+            else:
+                related = self.terms.get(uri, {}).get(prop_name, [])
+
+            for other in related:
+                if other not in seen:
+                    seen.add(other)
+                    pending += [other]
+
+        return sorted(self.compact(uri) for uri in seen - {start})
+
+    def search(self, words):
+        "Return terms with every word in their name, label, or comment."
+
+        matches = None
+        for word in _words(" ".join(words)):
+            uris = self.words.get(word, set())
+            matches = uris if matches is None else matches & uris
+
+        return sorted(self.compact(uri) for uri in matches or [])
+
+    def query(self, command, arguments):
+        "Run a query command and return the lines of its answer."
+
+        if command == "search":
+            return self.search(arguments)
+
+        if len(arguments) != 1:
+            raise KeyError(f"{command} takes a single term")
+
+        term = arguments[0]
+        if command == "term":
+            return self.describe(term)
+        if command in ["domain", "range"]:
+            return self.subjects(command, term)
+        if command == "subclasses":
+            return self.closure(term, "subClassOf", True)
+        if command == "superclasses":
+            return self.closure(term, "subClassOf")
+
+        raise KeyError(f"unknown command '{command}'")
+
+
+class Library:
+    """The bundles in some paths, and an index of all of their data.
+
+    Each bundle is loaded separately, so when some change, only those are
+    loaded again before the index is rebuilt.
+    """
+
+    def __init__(self, paths=None):
+        self._lv2bundles = importlib.import_module("lv2bundles")
+        self.paths = paths or self._lv2bundles.lv2_path()
+        self.bundles = {}  # Bundle path => lv2bundles.Vocabulary
+        self.index = Index([], {})
+
+    def refresh(self):
+        "Reload any changed bundles and return the paths of those loaded."
+
+        found = self._lv2bundles.find_bundles(self.paths)
+        removed = set(self.bundles) - set(found)
+        changed = [
+            b
+            for b in found
+            if b not in self.bundles or not self.bundles[b].is_fresh()
+        ]
+
+        for bundle in removed:
+            del self.bundles[bundle]
+
+        for bundle in changed:
+            try:
+                self.bundles[bundle] = self._lv2bundles.Vocabulary([bundle])
+            except (OSError, SyntaxError) as error:
+                sys.stderr.write(f"error: {bundle}: {error}\n")
+                self.bundles.pop(bundle, None)
+
+        if changed or removed:
+            prefixes = {}
+            for vocabulary in self.bundles.values():
+                for file_prefixes in vocabulary.prefixes.values():
+                    prefixes.update(file_prefixes)
+
+            graphs = itertools.chain.from_iterable(
+                v.graphs.values() for v in self.bundles.values()
+            )
+            self.index = Index(graphs, prefixes)
+
+        return changed
+
+    def query(self, command, arguments):
+        "Run a query on the latest data and return the lines of its answer."
+
+        for bundle in self.refresh():
+            sys.stderr.write(f"note: Loaded {bundle}\n")
+
+        return self.index.query(command, arguments)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    "Answers a single query written as a line of JSON."
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return  # Connection closed without a query
+
+        library = self.server.library
+        start = time.perf_counter()
+        try:
+            request = json.loads(line)
+            response = {
+                "lines": library.query(
+                    request["command"], request["arguments"]
+                )
+            }
+        except (KeyError, TypeError, ValueError) as error:
+            response = {"error": error.args[0]}
+
+        response["seconds"] = time.perf_counter() - start
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+def serve(socket_path, paths):
+    "Load bundles and answer queries on a socket until interrupted."
+
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            if client.connect_ex(socket_path) == 0:
+                sys.stderr.write(f"error: Already serving on {socket_path}\n")
+                return 1
+
+        os.remove(socket_path)
+
+    # Bundles are only loaded by the server, so the client never loads rdflib
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(scripts_dir, "..", "lv2specgen"))
+
+    library = Library(paths)
+    start = time.perf_counter()
+    library.refresh()
+    print(
+        f"Loaded {len(library.bundles)} bundles with"
+        f" {len(library.index.terms)} terms"
+        f" in {time.perf_counter() - start:.2f} s"
+    )
+
+    # Exit cleanly when terminated, so the socket is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    with socketserver.UnixStreamServer(socket_path, _Handler) as server:
+        server.library = library
+        print(f"Serving on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+    return 0
+
+
+def query(socket_path, command, arguments, show_time=False):
+    "Send a query to the server and print the answer."
+
+    request = {"command": command, "arguments": arguments}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError as error:
+            sys.stderr.write(f"error: No server at {socket_path} ({error})\n")
+            return 1
+
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as response_file:
+            response = json.loads(response_file.readline())
+
+    if show_time:
+        sys.stderr.write(f"note: Answered in {response['seconds']:.6f} s\n")
+
+    if "error" in response:
+        sys.stderr.write(f"error: {response['error']}\n")
+        return 1
+
+    for line in response["lines"]:
+        print(line)
+
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... COMMAND [ARGUMENT]...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--socket",
+        default=default_socket_path(),
+        help="path of the server socket (default: %(default)s)",
+    )
+    ap.add_argument(
+        "--time",
+        action="store_true",
+        help="print the time the server took to answer",
+    )
+
+    commands = ap.add_subparsers(title="commands", dest="command")
+    commands.required = True
+
+    serve_parser = commands.add_parser("serve", help="run the server")
+    serve_parser.add_argument(
+        "paths",
+        nargs="*",
+        metavar="BUNDLE_OR_DIR",
+        help="bundle or directory of bundles (default: LV2_PATH)",
+    )
+
+    for query_command, query_help in [
+        ("term", "describe a term"),
+        ("domain", "list properties with a domain"),
+        ("range", "list properties with a range"),
+        ("subclasses", "list all subclasses of a class"),
+        ("superclasses", "list all superclasses of a class"),
+    ]:
+        query_parser = commands.add_parser(query_command, help=query_help)
+        query_parser.add_argument("arguments", nargs=1, metavar="TERM")
+
+    search_parser = commands.add_parser(
+        "search", help="list terms with words in their label or comment"
+    )
+    search_parser.add_argument("arguments", nargs="+", metavar="WORD")
+
+    args = ap.parse_args(sys.argv[1:])
+    if args.command == "serve":
+        sys.exit(serve(args.socket, args.paths))
+
+    sys.exit(query(args.socket, args.command, args.arguments, args.time))
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Build the LV2 documentation and run the data checks as a single pipeline.
+
+Every step is a job with declared input and output files, and a job depends
+on the jobs that write its inputs.  Independent jobs run in parallel, and a
+job is skipped if its command and the contents of its inputs are the same as
+the last time it succeeded.  The critical path, the chain of jobs that
+determined the total time, is reported at the end.
+
+This is meant for iterating on the specifications without configuring a
+meson build, which remains the reference for what gets installed.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# The bundle discovery module is shared with lv2specgen
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_SCRIPTS_DIR, "..", "lv2specgen"))
+
+import lv2bundles  # noqa: E402 pylint: disable=wrong-import-position
+
+ROOT_URI = "http://lv2plug.in/ns/"
+STATE_FILENAME = "pipeline.json"
+BOOK_EXTENSIONS = [".c", ".h", ".ttl", ".txt"]
+
+_LIST_EMAIL = "devel@lists.lv2plug.in"
+_LIST_PAGE = "http://lists.lv2plug.in/listinfo.cgi/devel-lv2plug.in"
+
+
+class Job:
+    """A command that reads some files and writes others.
+
+    The status is None until the job is finished, then one of "ran",
+    "skipped" (unchanged since the last successful run), "failed", or
+    "blocked" (not run because a dependency failed).
+    """
+
+    def __init__(self, name, command, inputs, outputs=None):
+        self.name = name
+        self.command = [str(arg) for arg in command]
+        self.inputs = sorted(set(inputs))
+        self.outputs = list(outputs or [])
+        self.dependencies = []
+        self.status = None
+        self.span = (0.0, 0.0)
+
+    def digest(self):
+        "Return a hash of the command and the contents of every input."
+
+        hasher = hashlib.sha256("\0".join(self.command).encode("utf-8"))
+        for path in self.inputs:
+            with open(path, "rb") as input_file:
+                content_digest = hashlib.sha256(input_file.read()).digest()
+
+            hasher.update(path.encode("utf-8") + b"\0" + content_digest)
+
+        return hasher.hexdigest()
+
+    def duration(self):
+        "Return the number of seconds the job took."
+
+        return self.span[1] - self.span[0]
+
+
+def link_jobs(jobs):
+    """Set the dependencies of jobs and return them in a runnable order.
+
+    Raises ValueError if two jobs write the same file, or if there is a
+    cycle.
+    """
+
+    producers = {}
+    for job in jobs:
+        for path in job.outputs:
+            if path in producers:
+                raise ValueError(f"{path} is written by several jobs")
+
+            producers[path] = job
+
+    for job in jobs:
+        job.dependencies = sorted(
+            {producers[p] for p in job.inputs if p in producers},
+            key=lambda j: j.name,
+        )
+
+    ordered = []
+    visited = set()
+    for job in jobs:
+        path = [(job, iter(job.dependencies))]
+        while path:
+            current, dependencies = path[-1]
+            dependency = next(dependencies, None)
+            if dependency is None:
+                path.pop()
+                if current not in visited:
+                    visited.add(current)
+                    ordered += [current]
+            elif any(dependency is p[0] for p in path):
+                raise ValueError(f"dependency cycle at {dependency.name}")
+            elif dependency not in visited:
+                path += [(dependency, iter(dependency.dependencies))]
+
+    return ordered
+
+
+class Runner:
+    "Runs jobs and records which ones succeeded in a state file."
+
+    def __init__(self, state_path, force=False):
+        self.state_path = state_path
+        self.force = force
+        self._lock = threading.Lock()
+        self._n_finished = 0
+        self._n_jobs = 0
+
+        try:
+            with open(state_path, "r", encoding="utf-8") as state_file:
+                self.state = json.load(state_file)
+        except (OSError, ValueError):
+            self.state = {}
+
+    def _finish(self, job, status, output=b""):
+        "Record the result of a job and print a progress line."
+
+        job.span = (job.span[0], time.monotonic())
+        job.status = status
+
+        with self._lock:
+            self._n_finished += 1
+            progress = f"[{self._n_finished}/{self._n_jobs}]"
+            print(f"{progress} {status} {job.name} ({job.duration():.2f} s)")
+            if output:
+                sys.stderr.write(output.decode("utf-8", "replace"))
+
+    def run_job(self, job):
+        "Run a job unless it is unchanged since it last succeeded."
+
+        job.span = (time.monotonic(), 0.0)
+        try:
+            digest = job.digest()
+        except OSError as error:
+            sys.stderr.write(f"error: {job.name}: {error}\n")
+            self.state.pop(job.name, None)
+            self._finish(job, "failed")
+            return
+
+        if (
+            not self.force
+            and self.state.get(job.name) == digest
+            and all(os.path.exists(p) for p in job.outputs)
+        ):
+            self._finish(job, "skipped")
+            return
+
+        for path in job.outputs:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        result = subprocess.run(
+            job.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            check=False,
+        )
+
+        if result.returncode != 0:
+            self.state.pop(job.name, None)
+            self._finish(job, "failed", result.stdout)
+        else:
+            self.state[job.name] = digest
+            self._finish(job, "ran")
+
+    def run(self, jobs, n_workers):
+        "Run jobs in dependency order, in parallel where possible."
+
+        self._n_jobs = len(jobs)
+        pending = list(jobs)
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(n_workers) as executor:
+            while pending or running:
+                for job in list(pending):
+                    statuses = [d.status for d in job.dependencies]
+                    if "failed" in statuses or "blocked" in statuses:
+                        pending.remove(job)
+                        job.span = (time.monotonic(),) * 2
+                        self._finish(job, "blocked")
+                    elif None not in statuses:
+                        pending.remove(job)
+                        running[executor.submit(self.run_job, job)] = job
+
+                if not running:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in done:
+                    del running[future]
+                    future.result()
+
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as state_file:
+            json.dump(self.state, state_file, indent=1, sort_keys=True)
+
+        os.replace(temp_path, self.state_path)
+
+
+def critical_path(jobs):
+    """Return the chain of jobs that took the longest in total.
+
+    The jobs must be in runnable order, as returned by link_jobs().
+    """
+
+    totals = {}
+    previous = {}
+    for job in jobs:
+        slowest = max(job.dependencies, key=totals.get, default=None)
+        totals[job] = job.duration() + (totals[slowest] if slowest else 0.0)
+        previous[job] = slowest
+
+    last = max(jobs, key=totals.get, default=None)
+    path = []
+    while last is not None:
+        path = [last] + path
+        last = previous[last]
+
+    return path
+
+
+def print_report(jobs, n_workers, elapsed):
+    "Print a summary of a run and its critical path."
+
+    counts = {}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+
+    work = sum(j.duration() for j in jobs)
+    print(
+        f"\n{counts.get('ran', 0)} ran, {counts.get('skipped', 0)} unchanged,"
+        f" {counts.get('failed', 0)} failed, {counts.get('blocked', 0)}"
+        f" blocked in {elapsed:.2f} s"
+        f" ({work:.2f} s of work on {n_workers} workers)"
+    )
+
+    path = critical_path(jobs)
+    print(f"Critical path ({sum(j.duration() for j in path):.2f} s):")
+    for job in path:
+        print(f"  {job.duration():8.2f} s  {job.name}")
+
+
+def _files(directory, extensions):
+    "Return a sorted list of files in a directory with given extensions."
+
+    return [
+        os.path.join(directory, f)
+        for f in sorted(os.listdir(directory))
+        if os.path.splitext(f)[1] in extensions
+    ]
+
+
+def _project_version(source_root):
+    "Return the project version from the top-level meson.build."
+
+    with open(os.path.join(source_root, "meson.build"), encoding="utf-8") as f:
+        match = re.search(r"^  version: '([^']*)'", f.read(), re.MULTILINE)
+
+    return match.group(1)
+
+
+def _specifications(source_root):
+    "Return a sorted list of (URI, data file, bundle) for specifications."
+
+    bundles = lv2bundles.find_bundles([os.path.join(source_root, "lv2")])
+    world = lv2bundles.World(bundles)
+    specifications = []
+    for spec in world.specifications():
+        filename = spec.rsplit("/", 1)[-1] + ".ttl"
+        for uri in world.model.objects(spec, lv2bundles.rdfs.seeAlso):
+            path = lv2bundles.file_path(uri)
+            if path is not None and os.path.basename(path) == filename:
+                specifications += [(str(spec), path, os.path.dirname(path))]
+
+    return sorted(specifications)
+
+
+def _relative(path, start):
+    "Return a relative URI path from the directory of start to path."
+
+    return os.path.relpath(path, os.path.dirname(start)).replace(os.sep, "/")
+
+
+def _vocabulary_args(source_root, out_dir):
+    "Return the arguments to load the common vocabulary from a cache."
+
+    return [
+        "--vocabulary=" + os.path.join(source_root, "schemas.lv2"),
+        "--vocabulary=" + os.path.join(source_root, "lv2", "core.lv2"),
+        "--vocabulary-cache=" + os.path.join(out_dir, "vocabulary.pickle"),
+    ]
+
+
+def _specgen_jobs(source_root, out_dir, specifications, tags_path=None):
+    "Return a job to generate the documentation for each specification."
+
+    specgen_dir = os.path.join(source_root, "lv2specgen")
+    prefix = [
+        sys.executable,
+        os.path.join(specgen_dir, "lv2specgen.py"),
+        "--list-email=" + _LIST_EMAIL,
+        "--list-page=" + _LIST_PAGE,
+        "--style-dir=" + os.path.join(source_root, "doc", "style"),
+        "--template=" + os.path.join(specgen_dir, "template.html"),
+    ] + _vocabulary_args(source_root, out_dir)
+
+    common_inputs = (
+        _files(specgen_dir, [".html", ".py"])
+        + _files(os.path.join(source_root, "schemas.lv2"), [".ttl"])
+        + _files(os.path.join(source_root, "lv2", "core.lv2"), [".ttl"])
+    )
+
+    if tags_path is not None:
+        common_inputs += [tags_path]
+
+    jobs = []
+    for uri, data_path, bundle in specifications:
+        page = os.path.join(
+            out_dir, "ns", uri.replace(ROOT_URI, "", 1) + ".html"
+        )
+        sidecar = os.path.splitext(page)[0] + ".json"
+        command = prefix + [
+            "--style-uri="
+            + _relative(os.path.join(out_dir, "style", "style.css"), page),
+            "--metadata=" + sidecar,
+        ]
+
+        if tags_path is not None:
+            docdir = _relative(os.path.join(out_dir, "c", "html"), page)
+            command += ["--tags", tags_path, "--docdir=" + docdir]
+
+        jobs += [
+            Job(
+                "specgen " + os.path.basename(bundle),
+                command + [data_path, page],
+                _files(bundle, [".ttl"]) + common_inputs,
+                [page, sidecar],
+            )
+        ]
+
+    return jobs
+
+
+def _index_job(source_root, out_dir, spec_files, sidecars):
+    "Return a job to write the index of all specifications."
+
+    script = os.path.join(source_root, "scripts", "lv2_build_index.py")
+    index_path = os.path.join(out_dir, "ns", "index.html")
+    command = [
+        sys.executable,
+        script,
+        "--lv2-version=" + _project_version(source_root),
+        "--lv2-source-root=" + source_root,
+        "--output=" + index_path,
+    ] + _vocabulary_args(source_root, out_dir)
+
+    return Job(
+        "index",
+        command + spec_files + sidecars,
+        spec_files
+        + sidecars
+        + _files(os.path.join(source_root, "schemas.lv2"), [".ttl"])
+        + _files(os.path.join(source_root, "lv2specgen"), [".py"])
+        + [script, os.path.join(source_root, "doc", "index.html.in")],
+        [index_path],
+    )
+
+
+def _book_job(source_root, out_dir):
+    "Return a job to write the source of the plugin book."
+
+    plugins_dir = os.path.join(source_root, "plugins")
+    inputs = [os.path.join(plugins_dir, "README.txt")]
+    for name in sorted(os.listdir(plugins_dir)):
+        if name.startswith("eg-") and name.endswith(".lv2"):
+            inputs += _files(os.path.join(plugins_dir, name), BOOK_EXTENSIONS)
+
+    script = os.path.join(plugins_dir, "literasc.py")
+    book_path = os.path.join(out_dir, "book.txt")
+    cache_dir = os.path.join(out_dir, "book_cache")
+
+    return Job(
+        "book",
+        [sys.executable, script, "--cache-dir", cache_dir, book_path] + inputs,
+        inputs + [script],
+        [book_path],
+    )
+
+
+def _check_jobs(source_root, specifications, spec_files):
+    "Return jobs to check the specification data."
+
+    scripts_dir = os.path.join(source_root, "scripts")
+    schemas = os.path.join(source_root, "schemas.lv2")
+    data_files = spec_files + _files(schemas, [".ttl"])
+
+    script = os.path.join(scripts_dir, "lv2_check_specification.py")
+    jobs = []
+    for _, _, bundle in specifications:
+        jobs += [
+            Job(
+                "check " + os.path.basename(bundle),
+                [sys.executable, script, os.path.join(bundle, "manifest.ttl")],
+                _files(bundle, [".ttl"]) + [script],
+            )
+        ]
+
+    syntax_scripts = [
+        os.path.join(scripts_dir, "lv2_check_syntax.py"),
+        os.path.join(scripts_dir, "lv2_format_turtle.py"),
+    ]
+
+    references_scripts = [
+        os.path.join(scripts_dir, "lv2_check_references.py"),
+        os.path.join(scripts_dir, "lv2_snapshot.py"),
+    ]
+
+    return jobs + [
+        Job(
+            "syntax",
+            [sys.executable, syntax_scripts[0], "--backend", "python"]
+            + data_files,
+            data_files + syntax_scripts,
+        ),
+        Job(
+            "references",
+            [sys.executable, references_scripts[0]]
+            + [os.path.join(source_root, "lv2"), schemas],
+            data_files + references_scripts,
+        ),
+    ]
+
+
+def pipeline_jobs(source_root, out_dir, tags_path=None):
+    "Return every job needed to build the documentation and check the data."
+
+    specifications = _specifications(source_root)
+    spec_files = [p for _, _, b in specifications for p in _files(b, [".ttl"])]
+    specgen_jobs = _specgen_jobs(
+        source_root, out_dir, specifications, tags_path
+    )
+
+    sidecars = [job.outputs[1] for job in specgen_jobs]
+    return (
+        specgen_jobs
+        + [_index_job(source_root, out_dir, spec_files, sidecars)]
+        + [_book_job(source_root, out_dir)]
+        + _check_jobs(source_root, specifications, spec_files)
+    )
+
+
+def run(out_dir, n_workers, force=False, tags_path=None):
+    "Run the pipeline, returning non-zero if any job failed."
+
+    source_root = os.path.normpath(os.path.join(_SCRIPTS_DIR, ".."))
+    out_dir = os.path.abspath(out_dir)
+    if tags_path is not None:
+        tags_path = os.path.abspath(tags_path)
+
+    jobs = link_jobs(pipeline_jobs(source_root, out_dir, tags_path))
+
+    os.makedirs(out_dir, exist_ok=True)
+    runner = Runner(os.path.join(out_dir, STATE_FILENAME), force)
+
+    start = time.monotonic()
+    runner.run(jobs, n_workers)
+    print_report(jobs, n_workers, time.monotonic() - start)
+
+    return int(any(j.status not in ["ran", "skipped"] for j in jobs))
+
+
+def _list_jobs(out_dir, tags_path=None):
+    "Print every job and the jobs it depends on, in runnable order."
+
+    source_root = os.path.normpath(os.path.join(_SCRIPTS_DIR, ".."))
+    jobs = pipeline_jobs(source_root, os.path.abspath(out_dir), tags_path)
+    for job in link_jobs(jobs):
+        dependencies = ", ".join(d.name for d in job.dependencies)
+        print(f"{job.name}: {dependencies}" if dependencies else job.name)
+
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... OUTPUT_DIR",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of jobs to run in parallel",
+    )
+    ap.add_argument(
+        "--force",
+        action="store_true",
+        help="run every job, even if it is unchanged",
+    )
+    ap.add_argument(
+        "--list",
+        action="store_true",
+        help="list the jobs and their dependencies without running them",
+    )
+    ap.add_argument("--tags", help="Doxygen tags file for C API links")
+    ap.add_argument("OUTPUT_DIR", help="directory to write outputs to")
+
+    args = ap.parse_args(sys.argv[1:])
+    if args.list:
+        sys.exit(_list_jobs(args.OUTPUT_DIR, args.tags))
+
+    sys.exit(run(args.OUTPUT_DIR, args.jobs, args.force, args.tags))
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Compile LV2 data into a binary snapshot, or query a snapshot.
+
+A snapshot contains a sorted dictionary of every term in N-Triples syntax,
+and the triples as rows of term indices sorted in SPO, POS, and OSP order.
+It is read through mmap, so opening one is nearly free, and queries are
+binary searches that don't create any rdflib objects.
+"""
+
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import sys
+
+import rdflib
+
+MAGIC = b"LV2SNAP\0"
+VERSION = 1
+
+# Magic, version, number of terms, number of triples
+_HEADER = struct.Struct("<8sIII")
+
+# The orderings of triple rows, as positions of (subject, predicate, object)
+ORDERINGS = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+
+
+def bundle_paths(paths):
+    "Return a sorted list of all bundle directories in or at paths."
+
+    bundles = set()
+    for path in paths:
+        if os.path.isfile(os.path.join(path, "manifest.ttl")):
+            bundles.add(os.path.normpath(path))
+            continue
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                manifest_path = os.path.join(entry.path, "manifest.ttl")
+                if entry.is_dir() and os.path.isfile(manifest_path):
+                    bundles.add(os.path.normpath(entry.path))
+
+    return sorted(bundles)
+
+
+def load_corpus(bundles):
+    "Load every Turtle file in every bundle into a single model."
+
+    model = rdflib.Graph()
+    for bundle in bundles:
+        for filename in sorted(os.listdir(bundle)):
+            if filename.endswith(".ttl"):
+                path = os.path.join(bundle, filename)
+                try:
+                    model.parse(path, format="n3")
+                except SyntaxError:
+                    sys.stderr.write(f"error: Failed to parse {path}\n")
+                    raise
+
+    return model
+
+
+def model_triples(model):
+    "Return the triples in an rdflib model as N-Triples term strings."
+
+    return [(s.n3(), p.n3(), o.n3()) for s, p, o in model]
+
+
+def _pad(length):
+    "Return the padding needed to align length to 4 bytes."
+
+    return b"\0" * (-length % 4)
+
+
+def compile_snapshot(triples):
+    "Return the binary snapshot of triples of N-Triples term strings."
+
+    triples = sorted(set(triples))
+    encoded = sorted({t.encode("utf-8") for triple in triples for t in triple})
+    ids = {term.decode("utf-8"): i for i, term in enumerate(encoded)}
+
+    offsets = [0]
+    for term in encoded:
+        offsets += [offsets[-1] + len(term)]
+
+    blob = b"".join(encoded)
+    chunks = [
+        _HEADER.pack(MAGIC, VERSION, len(encoded), len(triples)),
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        blob,
+        _pad(len(blob)),
+    ]
+
+    rows = [tuple(ids[t] for t in triple) for triple in triples]
+    for order in ORDERINGS.values():
+        ordered = sorted(tuple(row[i] for i in order) for row in rows)
+        flat = [i for row in ordered for i in row]
+        chunks += [struct.pack(f"<{len(flat)}I", *flat)]
+
+    return b"".join(chunks)
+
+
+def _uint32_view(buffer, offset, count):
+    "Return a view of count little-endian 32-bit integers at an offset."
+
+    end = offset + 4 * count
+    view = memoryview(buffer)[offset:end]
+    if sys.byteorder == "little":
+        return view.cast("I")
+
+    return struct.unpack(f"<{count}I", view)
+
+
+def _leading(ids):
+    "Return the leading bound (not None) values in a sequence of ids."
+
+    return tuple(itertools.takewhile(lambda i: i is not None, ids))
+
+
+class Snapshot:
+    """A read-only store backed by a snapshot file.
+
+    Terms and triples are N-Triples strings, for example "<http://...>" or
+    '"1"^^<http://www.w3.org/2001/XMLSchema#integer>'.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as snapshot_file:
+            self._map = mmap.mmap(
+                snapshot_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        magic, version, n_terms, n_triples = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} snapshot")
+
+        offset = _HEADER.size
+        self._offsets = _uint32_view(self._map, offset, n_terms + 1)
+        offset += 4 * (n_terms + 1)
+        blob_size = self._offsets[-1]
+        self._blob = memoryview(self._map)[offset:][:blob_size]
+        offset += blob_size + len(_pad(blob_size))
+
+        self._indices = {}
+        for name in ORDERINGS:
+            self._indices[name] = _uint32_view(
+                self._map, offset, 3 * n_triples
+            )
+            offset += 12 * n_triples
+
+        self.n_terms = n_terms
+        self.n_triples = n_triples
+
+    def _term_bytes(self, term_id):
+        "Return the encoded term with an index."
+
+        start, end = self._offsets[term_id], self._offsets[term_id + 1]
+        return self._blob[start:end]
+
+    def term(self, term_id):
+        "Return the string of the term with an index."
+
+        return bytes(self._term_bytes(term_id)).decode("utf-8")
+
+    def term_id(self, term):
+        "Return the index of a term string, or None if it is not present."
+
+        encoded = term.encode("utf-8")
+        lo = 0
+        hi = self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._term_bytes(mid)) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self.n_terms and self._term_bytes(lo) == encoded:
+            return lo
+
+        return None
+
+    def _bound(self, index, prefix, upper):
+        "Return the first row in an index not before (or after) a prefix."
+
+        n_bound = len(prefix)
+        lo = 0
+        hi = self.n_triples
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = tuple(index[3 * mid + i] for i in range(n_bound))
+            if key < prefix or (upper and key == prefix):
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def _rows(self, name, prefix):
+        "Yield the (s, p, o) rows in an index that start with a prefix."
+
+        index = self._indices[name]
+        start = self._bound(index, prefix, False)
+        end = self._bound(index, prefix, True)
+        order = ORDERINGS[name]
+        for row in range(start, end):
+            triple = [0, 0, 0]
+            for i, position in enumerate(order):
+                triple[position] = index[3 * row + i]
+
+            yield tuple(triple)
+
+    def triple_ids(self, subject=None, predicate=None, obj=None):
+        "Yield (s, p, o) index triples that match a pattern of strings."
+
+        pattern = (subject, predicate, obj)
+        ids = [None if t is None else self.term_id(t) for t in pattern]
+        if any(t is not None and i is None for t, i in zip(pattern, ids)):
+            return  # A term that isn't in the snapshot matches nothing
+
+        # Use the index where the bound terms are a prefix of the rows
+        s, p, o = ids
+        if s is not None and p is None and o is not None:
+            yield from self._rows("osp", (o, s))
+        elif s is not None:
+            yield from self._rows("spo", _leading((s, p, o)))
+        elif p is not None:
+            yield from self._rows("pos", _leading((p, o)))
+        else:
+            yield from self._rows("osp", _leading((o,)))
+
+    def triples(self, subject=None, predicate=None, obj=None):
+        "Yield (s, p, o) string triples that match a pattern of strings."
+
+        for triple in self.triple_ids(subject, predicate, obj):
+            yield tuple(self.term(i) for i in triple)
+
+    def close(self):
+        "Unmap the snapshot file."
+
+        self._offsets = self._blob = self._indices = None
+        self._map.close()
+
+
+def _compile_command(args):
+    "Compile bundles into a snapshot file."
+
+    model = load_corpus(bundle_paths(args.paths))
+    snapshot = compile_snapshot(model_triples(model))
+    with open(args.output, "wb") as output:
+        output.write(snapshot)
+
+    return 0
+
+
+def _query_command(args):
+    "Print the triples in a snapshot that match a pattern."
+
+    snapshot = Snapshot(args.snapshot)
+    for triple in snapshot.triples(args.subject, args.predicate, args.object):
+        print(" ".join(triple) + " .")
+
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... COMMAND ...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    commands = ap.add_subparsers(title="commands", required=True)
+
+    compile_parser = commands.add_parser("compile", help="compile a snapshot")
+    compile_parser.add_argument("output", help="snapshot file to write")
+    compile_parser.add_argument(
+        "paths", nargs="+", help="bundle or directory containing bundles"
+    )
+    compile_parser.set_defaults(function=_compile_command)
+
+    query_parser = commands.add_parser("query", help="query a snapshot")
+    query_parser.add_argument("-s", "--subject", help="subject to match")
+    query_parser.add_argument("-p", "--predicate", help="predicate to match")
+    query_parser.add_argument("-o", "--object", help="object to match")
+    query_parser.add_argument("snapshot", help="snapshot file to read")
+    query_parser.set_defaults(function=_query_command)
+
+    parsed = ap.parse_args(sys.argv[1:])
+    sys.exit(parsed.function(parsed))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Run the LV2 Python tools as commands of a single program.
+
+Each command runs one of the tool scripts in this process, exactly as if the
+script was run with the same arguments.  With --stdin, command lines are
+read from standard input and run one after another, so modules like rdflib,
+and data like the shared vocabulary, are only loaded once.  This is much
+faster than starting a new interpreter for every file, for example:
+
+  printf '%s\\n' 'check-syntax lv2/atom.lv2/atom.ttl' \\
+                 'check-specification lv2/atom.lv2' | lv2_tool.py --stdin
+
+With --status-fd, a line "exit STATUS" is written to the given file
+descriptor after each command read from standard input, so that a caller can
+tell when it is finished.  This is separate from standard output, so output
+from commands can't be mistaken for it, for example:
+
+  lv2_tool.py --stdin --status-fd 3 3>status.txt <commands.txt
+"""
+
+import argparse
+import os
+import runpy
+import shlex
+import sys
+import traceback
+
+_SOURCE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Scripts imported by the tools must be found like when they are run directly
+sys.path.insert(0, os.path.join(_SOURCE_ROOT, "lv2specgen"))
+
+# Command names, and the path of the script for each relative to the root
+COMMANDS = {
+    "atom": "scripts/lv2_atom.py",
+    "bench": "scripts/lv2_bench.py",
+    "build-index": "scripts/lv2_build_index.py",
+    "check-references": "scripts/lv2_check_references.py",
+    "check-specification": "scripts/lv2_check_specification.py",
+    "check-syntax": "scripts/lv2_check_syntax.py",
+    "compress-docs": "scripts/lv2_compress_docs.py",
+    "docgen": "lv2specgen/lv2docgen.py",
+    "format-turtle": "scripts/lv2_format_turtle.py",
+    "latency": "scripts/lv2_latency.py",
+    "literasc": "plugins/literasc.py",
+    "lookup": "scripts/lv2_lookup.py",
+    "pipeline": "scripts/lv2_pipeline.py",
+    "snapshot": "scripts/lv2_snapshot.py",
+    "specgen": "lv2specgen/lv2specgen.py",
+}
+
+
+def _exit_status(code):
+    "Return the process exit status for the code of a SystemExit."
+
+    if code is None:
+        return 0
+
+    if isinstance(code, int):
+        return code
+
+    sys.stderr.write(f"{code}\n")
+    return 1
+
+
+def run_command(arguments):
+    "Run a command line in this process and return its exit status."
+
+    if not arguments or arguments[0] not in COMMANDS:
+        name = arguments[0] if arguments else ""
+        sys.stderr.write(f"error: Unknown command '{name}'\n")
+        return 1
+
+    path = os.path.normpath(os.path.join(_SOURCE_ROOT, COMMANDS[arguments[0]]))
+    saved_argv = sys.argv
+    sys.argv = [path] + arguments[1:]
+    try:
+        runpy.run_path(path, run_name="__main__")
+        status = 0
+    except SystemExit as exit_exception:
+        status = _exit_status(exit_exception.code)
+    except Exception:  # pylint: disable=broad-exception-caught
+        # Report crashes like the interpreter would, but keep running
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.argv = saved_argv
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    return status
+
+
+def run_stream(stream, status_file=None):
+    """Run every command line in a stream, returning non-zero if any failed.
+
+    If status_file is given, then "exit STATUS" is written to it after each
+    command.
+    """
+
+    failed = False
+    for line in stream:
+        arguments = shlex.split(line, comments=True)
+        if arguments:
+            status = run_command(arguments)
+            failed = failed or status != 0
+            if status_file is not None:
+                status_file.write(f"exit {status}\n")
+                status_file.flush()
+
+    return int(failed)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... [COMMAND [ARGUMENT]...]",
+        description=__doc__,
+        epilog="commands: " + ", ".join(COMMANDS),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--stdin",
+        action="store_true",
+        help="read command lines from standard input",
+    )
+    ap.add_argument(
+        "--status-fd",
+        type=int,
+        metavar="FD",
+        help="file descriptor to write command exit statuses to",
+    )
+    ap.add_argument("command", nargs="?", help="command to run")
+    ap.add_argument(
+        "arguments", nargs=argparse.REMAINDER, help="command arguments"
+    )
+
+    args = ap.parse_args(sys.argv[1:])
+    if args.stdin:
+        if args.command is not None:
+            ap.error("a command can't be given with --stdin")
+
+        status_output = None
+        if args.status_fd is not None:
+            try:
+                status_output = os.fdopen(
+                    args.status_fd, "w", encoding="utf-8"
+                )
+            except OSError as error:
+                ap.error(f"bad status descriptor {args.status_fd} ({error})")
+
+        sys.exit(run_stream(sys.stdin, status_output))
+
+    if args.status_fd is not None:
+        ap.error("--status-fd can only be used with --stdin")
+
+    if args.command is None:
+        ap.error("a command or --stdin is required")
+
+    sys.exit(run_command([args.command] + args.arguments))
@@ -0,0 +1,135 @@
+// Copyright 2022 David Robillard <d@drobilla.net>
+// SPDX-License-Identifier: ISC
+
+/*
+  Writes a sequence built with the forge, for checking other encoders.
+
+  Events are read from stdin, one per line, as a time in frames, a body type,
+  a body size, then the octets of the body in hex, for example:
+
+    12 5 4 00 00 80 3f
+
+  The complete sequence atom is written to stdout in native byte order.
+*/
+
+#include "atom_test_utils.c"
+
+#include "lv2/atom/atom.h"
+#include "lv2/atom/forge.h"
+#include "lv2/atom/util.h"
+#include "lv2/urid/urid.h"
+
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+typedef struct {
+  int64_t  frames;
+  uint32_t type;
+  uint32_t size;
+  uint8_t* body;
+} Event;
+
+static void
+free_events(Event* const events, const size_t n_events)
+{
+  for (size_t i = 0U; i < n_events; ++i) {
+    free(events[i].body);
+  }
+
+  free(events);
+}
+
+static int
+read_event(Event* const event)
+{
+  long long frames = 0;
+  unsigned  type   = 0U;
+  unsigned  size   = 0U;
+  const int n_read = scanf("%lld %u %u", &frames, &type, &size);
+
+  event->body = NULL;
+  if (n_read == EOF) {
+    return 1;
+  }
+
+  if (n_read != 3) {
+    return test_fail("Invalid event header\n") + 1;
+  }
+
+  event->frames = (int64_t)frames;
+  event->type   = type;
+  event->size   = size;
+  event->body   = (uint8_t*)calloc(1U, size + 1U);
+  for (uint32_t i = 0U; i < size; ++i) {
+    unsigned octet = 0U;
+    if (scanf("%2x", &octet) != 1) {
+      return test_fail("Invalid event body\n") + 1;
+    }
+
+    event->body[i] = (uint8_t)octet;
+  }
+
+  return 0;
+}
+
+int
+main(void)
+{
+  Event* events   = NULL;
+  size_t n_events = 0U;
+  size_t capacity = sizeof(LV2_Atom_Sequence);
+  int    st       = 0;
+
+  // Read all events to find the size of the sequence
+  for (;;) {
+    events = (Event*)realloc(events, (n_events + 1U) * sizeof(Event));
+    if ((st = read_event(&events[n_events]))) {
+      break;
+    }
+
+    const uint32_t size = events[n_events++].size;
+    capacity += sizeof(LV2_Atom_Event) + lv2_atom_pad_size(size);
+  }
+
+  if (st > 1) {
+    free(events[n_events].body);
+    free_events(events, n_events);
+    free_urid_map();
+    return 1;
+  }
+
+  st = 0;
+
+  uint8_t* const       buf = (uint8_t*)malloc(capacity);
+  LV2_URID_Map         map = {NULL, urid_map};
+  LV2_Atom_Forge       forge;
+  LV2_Atom_Forge_Frame frame;
+  lv2_atom_forge_init(&forge, &map);
+  lv2_atom_forge_set_buffer(&forge, buf, capacity);
+
+  // Write every event with the generic forge functions
+  lv2_atom_forge_sequence_head(&forge, &frame, 0U);
+  for (size_t i = 0U; i < n_events; ++i) {
+    lv2_atom_forge_frame_time(&forge, events[i].frames);
+    lv2_atom_forge_atom(&forge, events[i].size, events[i].type);
+    if (!lv2_atom_forge_write(&forge, events[i].body, events[i].size)) {
+      st = test_fail("Forge overflow at event %zu\n", i);
+      break;
+    }
+  }
+
+  lv2_atom_forge_pop(&forge, &frame);
+  if (!st) {
+    const LV2_Atom* const seq = (const LV2_Atom*)buf;
+    const size_t          len = sizeof(LV2_Atom) + seq->size;
+    if (fwrite(buf, 1U, len, stdout) != len) {
+      st = test_fail("Failed to write sequence\n");
+    }
+  }
+
+  free(buf);
+  free_events(events, n_events);
+  free_urid_map();
+  return st;
+}
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Test the histograms of lv2_latency.py and the event schedules of lv2_bench.py.
+
+Percentiles of histograms are compared with numpy.percentile(), and must be
+within the relative error of the precision, from zero up to values near
+2**62.  Events added to a schedule must be split into a sequence for every
+cycle, with times relative to the start of the cycle.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy
+
+_SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "scripts")
+sys.path.insert(0, os.path.abspath(_SCRIPTS_DIR))
+
+# pylint: disable=wrong-import-position
+import lv2_atom  # noqa: E402
+import lv2_bench  # noqa: E402
+import lv2_latency  # noqa: E402
+
+# pylint: enable=wrong-import-position
+
+PERCENTILES = [0.0, 1.0, 25.0, 50.0, 90.0, 99.0, 99.9, 100.0]
+
+
+def _histogram_cases(rng):
+    "Yield (name, values) for every set of values to record."
+
+    yield "zero", numpy.zeros(100, numpy.int64)
+    yield "small", numpy.arange(1000, dtype=numpy.int64)
+
+    exponents = rng.uniform(0.0, 62.0, 10000)
+    spread = (2.0**exponents).astype(numpy.int64)
+    yield "spread", numpy.concatenate([[0, 1], spread])
+
+    near_max = numpy.int64(2**62) - rng.integers(0, 2**40, 1000)
+    yield "near 2**62", numpy.concatenate([near_max, [2**62]])
+
+
+def check_histograms(seed):
+    "Check percentiles of histograms, and return the number of failures."
+
+    n_failures = 0
+    for precision in [2, 4, 8]:
+        tolerance = 2.0 ** (1 - precision)
+        for name, values in _histogram_cases(numpy.random.default_rng(seed)):
+            histogram = lv2_latency.Histogram(precision)
+            for half in numpy.array_split(values, 2):
+                histogram.record(half)
+
+            for percentile in PERCENTILES:
+                actual = histogram.value_at_percentile(percentile)
+                expected = numpy.percentile(
+                    values, percentile, method="inverted_cdf"
+                )
+                if abs(actual - float(expected)) > expected * tolerance:
+                    sys.stderr.write(
+                        f"error: {name} with precision {precision}:"
+                        f" p{percentile:g} is {actual}, expected {expected}\n"
+                    )
+                    n_failures += 1
+
+            if histogram.max != values.max():
+                sys.stderr.write(f"error: {name}: Wrong maximum\n")
+                n_failures += 1
+
+    return n_failures
+
+
+def _cycle_events(sequence):
+    "Return a list of (time, type, body) for the events in a sequence."
+
+    atom = lv2_atom.read_atom(sequence)
+    return [
+        (e.time, e.type, bytes(e.body))
+        for e in lv2_atom.sequence_events(atom)
+    ]
+
+
+def check_schedule():
+    "Check that events are split into cycles, and return the failures."
+
+    host = lv2_bench.Host()
+    block_size = 4
+    schedule = lv2_bench.Schedule(host, block_size, 5)
+
+    # Events on both sides of cycle boundaries, added in two batches
+    first = numpy.array([0, 3, 4, 9, 15], numpy.int64)
+    first_rows = numpy.arange(len(first) * 2, dtype=numpy.uint8).reshape(-1, 2)
+    schedule.add_events(first, 1, first_rows)
+
+    second = numpy.array([4, 7], numpy.int64)
+    second_rows = numpy.full((len(second), 3), 0xFF, numpy.uint8)
+    schedule.add_events(second, 2, second_rows, numpy.array([1, 3]))
+
+    events = [(int(t), 1, bytes(r)) for t, r in zip(first, first_rows)]
+    events += [(4, 2, b"\xff"), (7, 2, b"\xff\xff\xff")]
+    events.sort(key=lambda e: e[0])
+
+    n_failures = 0
+    for cycle, sequence in enumerate(schedule.sequences):
+        start = cycle * block_size
+        expected = [
+            (t - start, event_type, body)
+            for t, event_type, body in events
+            if start <= t < start + block_size
+        ]
+
+        actual = _cycle_events(sequence)
+        if actual != expected:
+            sys.stderr.write(
+                f"error: Cycle {cycle} has {actual}, expected {expected}\n"
+            )
+            n_failures += 1
+
+        if not expected and sequence is not schedule.empty:
+            sys.stderr.write(f"error: Cycle {cycle} isn't the empty one\n")
+            n_failures += 1
+
+    return n_failures
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="seed for random values (default: %(default)s)",
+    )
+
+    args = ap.parse_args(sys.argv[1:])
+    sys.exit(int(check_histograms(args.seed) + check_schedule() > 0))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Test that lv2_lookup.py can serve bundles and answer a query.
+
+The server is started on a temporary socket, then a client looks up a term,
+which must succeed and print a description of the term.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def wait_for_socket(server, socket_path, timeout):
+    "Wait until the server is listening, and return true if it is."
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(socket_path):
+            return True
+
+        if server.poll() is not None:
+            return False
+
+        time.sleep(0.05)
+
+    return False
+
+
+def run_test(lookup, bundles, term, timeout):
+    "Serve bundles, look up a term, and return an exit status."
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        socket_path = os.path.join(temp_dir, "lookup.sock")
+        command = [sys.executable, lookup, "--socket", socket_path]
+        with subprocess.Popen(
+            command + ["serve"] + bundles, stdout=subprocess.DEVNULL
+        ) as server:
+            try:
+                if not wait_for_socket(server, socket_path, timeout):
+                    sys.stderr.write("error: Server failed to start\n")
+                    return 1
+
+                result = subprocess.run(
+                    command + ["term", term],
+                    capture_output=True,
+                    check=False,
+                    encoding="utf-8",
+                    timeout=timeout,
+                )
+            finally:
+                server.terminate()
+
+    sys.stderr.write(result.stderr)
+    if result.returncode != 0:
+        sys.stderr.write(f"error: Query failed with {result.returncode}\n")
+        return 1
+
+    lines = result.stdout.splitlines()
+    if len(lines) < 2 or lines[0] != term:
+        sys.stderr.write(f"error: Unexpected description of {term}:\n")
+        sys.stderr.write(result.stdout)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... LV2_LOOKUP BUNDLE...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--term",
+        default="atom:frameTime",
+        help="term to look up (default: %(default)s)",
+    )
+    ap.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="seconds to wait for the server (default: %(default)s)",
+    )
+    ap.add_argument("lookup", help="path to lv2_lookup.py")
+    ap.add_argument("bundles", nargs="+", help="bundles to serve")
+
+    args = ap.parse_args(sys.argv[1:])
+    sys.exit(run_test(args.lookup, args.bundles, args.term, args.timeout))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# Copyright 2022 David Robillard <d@drobilla.net>
+# SPDX-License-Identifier: ISC
+
+"""
+Test that pages served by lv2specgen.py match pages written by separate runs.
+
+Every specification is requested from one server in order, so later pages are
+rendered after earlier ones in the same process, and each page is compared
+with the output of running lv2specgen.py for only that specification.  Any
+options after LV2SPECGEN are passed to every run.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+
+def free_port():
+    "Return a port on localhost that is currently free."
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def fetch(url, timeout):
+    "Return the text of a page, or None if it couldn't be fetched."
+
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read().decode("utf-8")
+    except (OSError, urllib.error.URLError):
+        return None
+
+
+def wait_for_server(server, url, timeout):
+    "Wait until the server answers, and return true if it does."
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if fetch(url, timeout) is not None:
+            return True
+
+        if server.poll() is not None:
+            return False
+
+        time.sleep(0.1)
+
+    return False
+
+
+def check_pages(base_url, command, specs, timeout):
+    "Compare served pages with separate runs, and return the failures."
+
+    n_failures = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for spec in specs:
+            name = os.path.splitext(os.path.basename(spec))[0]
+            served = fetch(f"{base_url}{name}.html", timeout)
+            if served is None:
+                sys.stderr.write(f"error: Failed to fetch {name}.html\n")
+                n_failures += 1
+                continue
+
+            output = os.path.join(temp_dir, name + ".html")
+            subprocess.run(
+                command + [spec, output], check=True, stdout=subprocess.DEVNULL
+            )
+
+            with open(output, "r", encoding="utf-8") as written:
+                if written.read() != served:
+                    sys.stderr.write(f"error: Served {name} differs\n")
+                    n_failures += 1
+
+    return n_failures
+
+
+def run_test(lv2specgen, options, specs, timeout):
+    "Serve specs, compare every page, and return an exit status."
+
+    # Use the same date for every page, wherever it is rendered
+    os.environ.setdefault("SOURCE_DATE_EPOCH", str(int(time.time())))
+
+    port = free_port()
+    base_url = f"http://localhost:{port}/"
+    command = [sys.executable, lv2specgen] + options
+    with subprocess.Popen(
+        command + ["--serve", f"--port={port}"] + specs,
+        stdout=subprocess.DEVNULL,
+    ) as server:
+        try:
+            if not wait_for_server(server, base_url, timeout):
+                sys.stderr.write("error: Server failed to start\n")
+                return 1
+
+            n_failures = check_pages(base_url, command, specs, timeout)
+        finally:
+            server.terminate()
+
+    return int(n_failures > 0)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]... LV2SPECGEN [LV2SPECGEN_OPTION]...",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    ap.add_argument(
+        "--spec",
+        action="append",
+        required=True,
+        help="specification to serve, may be given several times",
+    )
+    ap.add_argument(
+        "--timeout",
+        type=float,
+        default=120.0,
+        help="seconds to wait for the server (default: %(default)s)",
+    )
+    ap.add_argument("lv2specgen", help="path to lv2specgen.py")
+    ap.add_argument(
+        "options", nargs=argparse.REMAINDER, help="options for lv2specgen.py"
+    )
+
+    args = ap.parse_args(sys.argv[1:])
+    sys.exit(run_test(args.lv2specgen, args.options, args.spec, args.timeout))